@@ -11,6 +11,7 @@ class MyClient(discord.Client):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    async def setup_hook(self):
         # create the background task and run it in the background
         self.bg_task = self.loop.create_task(self.my_background_task())
 
@@ -44,5 +45,18 @@ class MyClient(discord.Client):
             await channel.send(embed=embed)
 
 
-client = MyClient()
+# Guilds are needed to find the channel to post in, and guild messages for
+# on_message. Message content is a privileged intent (enable it for the bot in
+# the Developer Portal); without it on_message sees empty content. Nothing else
+# is subscribed to, and messages and members are not cached.
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+intents.message_content = True
+client = MyClient(
+    intents=intents,
+    max_messages=None,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False,
+)
 client.run(DISCORD_BOT_TOKEN)
@@ -0,0 +1,391 @@
+"""
+Measure bot startup time and memory against a fake Discord gateway.
+
+Starts a local server that answers the REST calls made at login and speaks
+enough of the gateway protocol to identify a client. It sends READY, one large
+guild (channels, roles and emojis) and a burst of messages, honouring the
+intents the client identified with, and answers member chunk requests. Each
+configuration is started in a fresh process and reports the time to on_ready
+and its RSS once every event has been processed.
+
+``default`` is discord.py's default intents and caches, which the bots used
+before; ``default+members`` adds the members intent with startup chunking.
+``nextupbot`` and ``rolebot`` use each dyno's ``gateway_options()``, and
+``rolebot+members`` sets DISCORD_BOT_MEMBERS_INTENT.
+
+Usage:
+    python discoreg/benchmarks/bot_gateway.py --members 20000 --messages 5000
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+GUILDS = 1 << 0
+GUILD_MEMBERS = 1 << 1
+GUILD_MESSAGES = 1 << 9
+
+GUILD_ID = 100
+BOT_ID = 99
+CHUNK_SIZE = 1000
+CONFIGS = ["default", "default+members", "nextupbot", "rolebot", "rolebot+members"]
+
+
+def user_payload(user_id):
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "discriminator": "0",
+        "global_name": f"User {user_id}",
+        "avatar": None,
+    }
+
+
+def member_payload(user_id, role_ids):
+    return {
+        "user": user_payload(user_id),
+        "roles": role_ids,
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(channels, roles, emojis, member_count):
+    return {
+        "id": str(GUILD_ID),
+        "name": "PyOhio",
+        "icon": None,
+        "owner_id": "1",
+        "afk_timeout": 300,
+        "verification_level": 0,
+        "default_message_notifications": 0,
+        "explicit_content_filter": 0,
+        "mfa_level": 0,
+        "nsfw_level": 0,
+        "premium_tier": 0,
+        "system_channel_flags": 0,
+        "preferred_locale": "en-US",
+        "features": [],
+        "large": True,
+        "unavailable": False,
+        "member_count": member_count,
+        "roles": [
+            {
+                "id": str(GUILD_ID if n == 0 else 1000 + n),
+                "name": f"role {n}",
+                "color": 0,
+                "hoist": False,
+                "position": n,
+                "permissions": "0",
+                "managed": False,
+                "mentionable": False,
+            }
+            for n in range(roles)
+        ],
+        "emojis": [
+            {
+                "id": str(5000 + n),
+                "name": f"emoji{n}",
+                "roles": [],
+                "require_colons": True,
+                "managed": False,
+                "animated": False,
+                "available": True,
+            }
+            for n in range(emojis)
+        ],
+        "channels": [
+            {
+                "id": str(10000 + n),
+                "type": 0,
+                "name": f"channel-{n}",
+                "position": n,
+                "permission_overwrites": [],
+                "topic": "Talk about the talk " * 5,
+                "nsfw": False,
+                "parent_id": None,
+            }
+            for n in range(channels)
+        ],
+        "members": [member_payload(BOT_ID, [])],
+        "threads": [],
+        "presences": [],
+        "voice_states": [],
+        "stickers": [],
+        "stage_instances": [],
+        "guild_scheduled_events": [],
+    }
+
+
+def message_payload(n, channels):
+    author_id = 200000 + n % 2000
+    return {
+        "id": str(900000 + n),
+        "type": 0,
+        "channel_id": str(10000 + n % channels),
+        "guild_id": str(GUILD_ID),
+        "author": user_payload(author_id),
+        "member": {
+            k: v for k, v in member_payload(author_id, []).items() if k != "user"
+        },
+        "content": "Great talk! " * 15,
+        "timestamp": "2024-07-27T15:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+    }
+
+
+def json_response(data):
+    # discord.py only decodes an exact "application/json" content type
+    return web.Response(body=json.dumps(data).encode(), content_type="application/json")
+
+
+def make_fake_discord(args, port):
+    async def current_user(request):
+        return json_response({**user_payload(BOT_ID), "bot": True})
+
+    async def application(request):
+        return json_response(
+            {
+                "id": str(BOT_ID),
+                "name": "bot",
+                "icon": None,
+                "description": "",
+                "bot_public": False,
+                "bot_require_code_grant": False,
+                "verify_key": "0" * 64,
+                "flags": 0,
+                "owner": user_payload(1),
+            }
+        )
+
+    async def gateway(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        sequence = 0
+
+        async def dispatch(event, data):
+            nonlocal sequence
+            sequence += 1
+            await ws.send_str(
+                json.dumps({"op": 0, "t": event, "s": sequence, "d": data})
+            )
+
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": 41250}})
+        async for message in ws:
+            payload = json.loads(message.data)
+            if payload["op"] == 1:
+                await ws.send_json({"op": 11})
+            elif payload["op"] == 2:
+                intents = payload["d"].get("intents", 0)
+                await dispatch(
+                    "READY",
+                    {
+                        "v": 10,
+                        "user": {**user_payload(BOT_ID), "bot": True},
+                        "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+                        "session_id": "session",
+                        "resume_gateway_url": f"ws://127.0.0.1:{port}/gateway",
+                        "application": {"id": str(BOT_ID), "flags": 0},
+                    },
+                )
+                if intents & GUILDS:
+                    await dispatch(
+                        "GUILD_CREATE",
+                        guild_payload(
+                            args.channels, args.roles, args.emojis, args.members
+                        ),
+                    )
+                if intents & GUILD_MESSAGES:
+                    for n in range(args.messages):
+                        await dispatch(
+                            "MESSAGE_CREATE", message_payload(n, args.channels)
+                        )
+                # Not a Discord event: tells the client every event was sent
+                await dispatch("BENCHMARK_DONE", {})
+            elif payload["op"] == 8:
+                chunk_count = -(-args.members // CHUNK_SIZE)
+                role_ids = [str(1001)]
+                for index in range(chunk_count):
+                    first = index * CHUNK_SIZE
+                    last = min(first + CHUNK_SIZE, args.members)
+                    await asyncio.sleep(args.chunk_latency_ms / 1000)
+                    await dispatch(
+                        "GUILD_MEMBERS_CHUNK",
+                        {
+                            "guild_id": str(GUILD_ID),
+                            "members": [
+                                member_payload(300000 + n, role_ids)
+                                for n in range(first, last)
+                            ],
+                            "chunk_index": index,
+                            "chunk_count": chunk_count,
+                            "nonce": payload["d"].get("nonce"),
+                        },
+                    )
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/api/v10/users/@me", current_user)
+    app.router.add_get("/api/v10/oauth2/applications/@me", application)
+    app.router.add_get("/gateway", gateway)
+    return app
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def gateway_options(config):
+    import discord
+    from django_setup import setup_django
+
+    if config == "rolebot+members":
+        os.environ["DISCORD_BOT_MEMBERS_INTENT"] = "1"
+    # Every configuration loads Django and both bots, so RSS differences come
+    # from the gateway session alone.
+    setup_django()
+    from nextupbot.management.commands import nextupbot, rolebot
+
+    if config == "nextupbot":
+        return nextupbot.gateway_options()
+    if config.startswith("rolebot"):
+        return rolebot.gateway_options()
+    intents = discord.Intents.default()
+    intents.members = config == "default+members"
+    return {"intents": intents}
+
+
+def run_client(config, port):
+    """Start one client, print its ready time and RSS as JSON, and exit."""
+    import discord
+    import yarl
+
+    options = gateway_options(config)
+    discord.http.Route.BASE = f"http://127.0.0.1:{port}/api/v10"
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(
+        f"ws://127.0.0.1:{port}/gateway"
+    )
+    gc.collect()
+    rss_before = rss_mb()
+
+    class BenchmarkClient(discord.Client):
+        async def setup_hook(self):
+            self.ready = asyncio.Event()
+            self.events_done = asyncio.Event()
+            self.done_task = asyncio.create_task(self.report())
+
+        async def on_ready(self):
+            self.ready_seconds = time.perf_counter() - start
+            self.ready.set()
+
+        async def on_socket_event_type(self, event):
+            if event == "BENCHMARK_DONE":
+                self.events_done.set()
+
+        async def report(self):
+            await self.ready.wait()
+            await self.events_done.wait()
+            gc.collect()
+            rss_after = rss_mb()
+            print(
+                json.dumps(
+                    {
+                        "ready": self.ready_seconds,
+                        "rss": rss_after,
+                        "growth": rss_after - rss_before,
+                        "messages": len(self.cached_messages),
+                        "members": sum(len(g.members) for g in self.guilds),
+                    }
+                )
+            )
+            await self.close()
+
+    client = BenchmarkClient(**options)
+    start = time.perf_counter()
+    asyncio.run(client.start("bot-token"))
+
+
+async def measure(config, port, runs):
+    results = []
+    for _ in range(runs):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            __file__,
+            "--client",
+            config,
+            "--port",
+            str(port),
+            stdout=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await process.communicate()
+        results.append(json.loads(stdout.decode().strip().splitlines()[-1]))
+    return {
+        key: statistics.median(result[key] for result in results) for key in results[0]
+    }
+
+
+async def main(args):
+    runner = web.AppRunner(make_fake_discord(args, args.port))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    try:
+        print(
+            f"{args.channels} channels, {args.roles} roles, {args.members} members, "
+            f"{args.messages} messages; median of {args.runs} runs"
+        )
+        print(
+            f"{'config':<16}  {'ready':>7}  {'RSS':>8}  {'growth':>8}"
+            f"  {'msgs':>5}  {'members':>7}"
+        )
+        for config in args.configs:
+            result = await measure(config, args.port, args.runs)
+            print(
+                f"{config:<16}  {result['ready']:>6.2f}s  "
+                f"{result['rss']:>6.1f}MB  {result['growth']:>6.1f}MB  "
+                f"{result['messages']:>5.0f}  {result['members']:>7.0f}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--channels", type=int, default=300)
+    parser.add_argument("--roles", type=int, default=100)
+    parser.add_argument("--emojis", type=int, default=50)
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--chunk-latency-ms", type=float, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--configs", nargs="+", choices=CONFIGS, default=CONFIGS)
+    parser.add_argument("--client", choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.client:
+        run_client(args.client, args.port)
+    else:
+        asyncio.run(main(args))
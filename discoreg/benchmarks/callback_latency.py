@@ -0,0 +1,155 @@
+"""
+Measure the Discord side of the registration callback against a fake Discord API.
+
+Starts a local aiohttp server that answers the token, user, guild member and
+member role endpoints after a fixed delay, then runs the join pipeline used by
+``registrations.views.callback`` for 1-20 roles and prints p50/p99 latency and
+the number of Discord requests per callback. The per-role columns replay the old
+one-request-per-role behaviour for comparison. ``--existing-member`` makes the
+member PUT answer 204 to exercise the concurrent per-role fallback.
+
+Usage:
+    python discoreg/benchmarks/callback_latency.py --latency-ms 50 --runs 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from registrations.discord_api import DiscordClient  # noqa: E402
+
+
+def make_fake_discord(latency, existing_member, counter):
+    @web.middleware
+    async def count_requests(request, handler):
+        counter["requests"] += 1
+        return await handler(request)
+
+    async def delayed(response):
+        await asyncio.sleep(latency)
+        return response
+
+    async def token(request):
+        return await delayed(
+            web.json_response({"access_token": "user-token", "token_type": "Bearer"})
+        )
+
+    async def user(request):
+        return await delayed(
+            web.json_response(
+                {"id": "1234", "username": "attendee", "email": "a@example.com"}
+            )
+        )
+
+    async def add_member(request):
+        if existing_member:
+            return await delayed(web.Response(status=204))
+        return await delayed(web.json_response({}, status=201))
+
+    async def member_role(request):
+        return await delayed(web.Response(status=204))
+
+    app = web.Application(middlewares=[count_requests])
+    app.router.add_post("/api/oauth2/token", token)
+    app.router.add_get("/api/users/@me", user)
+    app.router.add_put("/api/guilds/{guild_id}/members/{user_id}", add_member)
+    app.router.add_put(
+        "/api/guilds/{guild_id}/members/{user_id}/roles/{role_id}", member_role
+    )
+    return app
+
+
+async def callback_pipeline(client, role_ids, per_role=False):
+    token = await client.exchange_code("code", "https://localhost/callback")
+    user = await client.get_user(token)
+    if per_role:
+        await client.add_user_to_guild(user["id"], token)
+        for role_id in role_ids:
+            await client.add_user_to_role(user["id"], role_id)
+    else:
+        await client.join_guild(user["id"], token, role_ids)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def measure(client, counter, role_count, runs, per_role):
+    role_ids = [str(1000 + n) for n in range(role_count)]
+    samples = []
+    counter["requests"] = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        await callback_pipeline(client, role_ids, per_role=per_role)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, counter["requests"] / runs
+
+
+async def main(latency_ms, runs, max_roles, port, existing_member):
+    counter = {"requests": 0}
+    runner = web.AppRunner(
+        make_fake_discord(latency_ms / 1000, existing_member, counter)
+    )
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    client = DiscordClient(
+        api_base_url=f"http://127.0.0.1:{port}/api",
+        bot_token="bot-token",
+        guild_id="1",
+        client_id="client",
+        client_secret="secret",
+    )
+    try:
+        print(f"fake Discord latency: {latency_ms}ms, {runs} runs per row")
+        print(
+            f"{'roles':>5}  {'per-role p50':>12}  {'p99':>9}  {'reqs':>4}"
+            f"  {'bundled p50':>12}  {'p99':>9}  {'reqs':>4}"
+        )
+        for role_count in range(1, max_roles + 1):
+            per_role, per_role_requests = await measure(
+                client, counter, role_count, runs, per_role=True
+            )
+            bundled, bundled_requests = await measure(
+                client, counter, role_count, runs, per_role=False
+            )
+            print(
+                f"{role_count:>5}  "
+                f"{statistics.median(per_role):>10.1f}ms  "
+                f"{percentile(per_role, 99):>7.1f}ms  "
+                f"{per_role_requests:>4.0f}  "
+                f"{statistics.median(bundled):>10.1f}ms  "
+                f"{percentile(bundled, 99):>7.1f}ms  "
+                f"{bundled_requests:>4.0f}"
+            )
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-roles", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--existing-member", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.latency_ms,
+            args.runs,
+            args.max_roles,
+            args.port,
+            args.existing_member,
+        )
+    )
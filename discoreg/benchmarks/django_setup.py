@@ -0,0 +1,38 @@
+"""
+Shared setup for benchmarks that need the Django ORM.
+
+Benchmarks run against a throwaway test database created on the configured
+backend (set ``DATABASE_URL`` to benchmark Postgres), so they never touch real
+registration data.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+
+def setup_django():
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "discoreg.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """Create a test database for the duration of a benchmark."""
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,84 @@
+"""
+Compare EmailRole lookups by email before and after the LOWER(email) index.
+
+Seeds a test database with EmailRole rows, then times lookups of random
+mixed-case emails using the old ``email__iexact`` filter and
+``EmailRole.objects.for_email``, printing the query plan for each.
+
+Usage:
+    DATABASE_URL=postgres://... python discoreg/benchmarks/email_lookup.py --rows 100000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from django_setup import benchmark_database
+
+
+def seed(row_count, batch_size=5000):
+    from registrations.models import EmailRole
+
+    for start in range(0, row_count, batch_size):
+        EmailRole.objects.bulk_create(
+            EmailRole(email=f"attendee{n}@example.com")
+            for n in range(start, min(start + batch_size, row_count))
+        )
+
+
+def time_lookups(get_queryset, emails):
+    samples = []
+    for email in emails:
+        start = time.perf_counter()
+        get_queryset(email).get()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def explain(queryset):
+    try:
+        return queryset.explain()
+    except Exception as e:
+        return f"(no query plan: {e})"
+
+
+def main(row_count, lookups):
+    with benchmark_database() as connection:
+        from registrations.models import EmailRole
+
+        print(f"seeding {row_count} EmailRole rows on {connection.vendor}")
+        seed(row_count)
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("ANALYZE registrations_emailrole")
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+
+        emails = [
+            f"Attendee{random.randrange(row_count)}@Example.com" for _ in range(lookups)
+        ]
+        strategies = {
+            "email__iexact": lambda email: EmailRole.objects.filter(
+                email__iexact=email
+            ),
+            "for_email": lambda email: EmailRole.objects.for_email(email),
+        }
+        for name, get_queryset in strategies.items():
+            print()
+            print(f"{name}:")
+            print(explain(get_queryset(emails[0])))
+            samples = time_lookups(get_queryset, emails)
+            print(
+                f"  {lookups} lookups: mean {statistics.mean(samples):.3f}ms "
+                f"p50 {statistics.median(samples):.3f}ms "
+                f"max {max(samples):.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+    main(args.rows, args.lookups)
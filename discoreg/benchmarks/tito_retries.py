@@ -0,0 +1,68 @@
+"""
+Replay the same Tito webhooks repeatedly to simulate a retry storm.
+
+Each round posts every webhook again and reports request latency together with
+the Registration row count (and on Postgres the table's on-disk size), which
+should stay flat once the first round has been ingested.
+
+Usage:
+    python discoreg/benchmarks/tito_retries.py --webhooks 500 --rounds 10
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from django_setup import benchmark_database
+
+
+def table_size(connection):
+    if connection.vendor != "postgresql":
+        return "n/a"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size('registrations_registration')")
+        return f"{cursor.fetchone()[0] / 1024:.0f}KB"
+
+
+def main(webhooks, rounds):
+    with benchmark_database() as connection:
+        from django.conf import settings
+        from django.test import Client
+        from registrations.models import Registration
+
+        client = Client(HTTP_HOST="localhost")
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {settings.TITO_WEBHOOK_TOKEN}"}
+        payloads = [
+            json.dumps({"email": f"attendee{n}@example.com", "reference": f"T{n:06d}"})
+            for n in range(webhooks)
+        ]
+
+        print(f"{'round':>5}  {'p50':>8}  {'max':>8}  {'rows':>6}  {'size':>8}")
+        for round_number in range(1, rounds + 1):
+            samples = []
+            for payload in payloads:
+                start = time.perf_counter()
+                response = client.post(
+                    "/registrations/tito-webhook",
+                    data=payload,
+                    content_type="application/json",
+                    **headers,
+                )
+                samples.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 201, response.status_code
+            print(
+                f"{round_number:>5}  "
+                f"{statistics.median(samples):>6.2f}ms  "
+                f"{max(samples):>6.2f}ms  "
+                f"{Registration.objects.count():>6}  "
+                f"{table_size(connection):>8}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--webhooks", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    main(args.webhooks, args.rounds)
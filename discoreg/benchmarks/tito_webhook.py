@@ -0,0 +1,92 @@
+"""
+Load test the Tito webhook ingestion rate.
+
+Posts single-ticket webhooks and multi-ticket registration payloads to
+``registrations:tito-webhook`` through the Django test client against a test
+database, and prints requests and tickets ingested per second. A share of the
+emails repeat to mimic Tito resends.
+
+Usage:
+    python discoreg/benchmarks/tito_webhook.py --webhooks 2000 --tickets-per-order 10
+"""
+
+import argparse
+import json
+import random
+import time
+
+from django_setup import benchmark_database
+
+
+def post_all(client, payloads, token):
+    start = time.perf_counter()
+    for payload in payloads:
+        response = client.post(
+            "/registrations/tito-webhook",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        assert response.status_code == 201, response.status_code
+    return time.perf_counter() - start
+
+
+def make_ticket(n, attendees):
+    return {
+        "email": f"Attendee{random.randrange(attendees)}@example.com",
+        "reference": f"T{n:06d}",
+    }
+
+
+def main(webhooks, tickets_per_order, attendees):
+    with benchmark_database():
+        from django.conf import settings
+        from django.test import Client
+        from registrations.models import DiscordRole, DiscordServer, Registration
+
+        server = DiscordServer.objects.create(name="Bench", server_id="1")
+        for n in range(3):
+            DiscordRole.objects.create(
+                name=f"Default {n}",
+                discord_role_id=str(100 + n),
+                discord_server=server,
+                assign_by_default=True,
+            )
+
+        client = Client(HTTP_HOST="localhost")
+        token = settings.TITO_WEBHOOK_TOKEN
+
+        singles = [make_ticket(n, attendees) for n in range(webhooks)]
+        elapsed = post_all(client, singles, token)
+        print(
+            f"single-ticket webhooks: {webhooks / elapsed:.0f} requests/s "
+            f"({webhooks} tickets in {elapsed:.2f}s)"
+        )
+
+        orders = [
+            {
+                "email": f"buyer{n}@example.com",
+                "reference": f"O{n:06d}",
+                "tickets": [
+                    make_ticket(webhooks + n * tickets_per_order + t, attendees)
+                    for t in range(tickets_per_order)
+                ],
+            }
+            for n in range(webhooks // tickets_per_order)
+        ]
+        ticket_count = len(orders) * tickets_per_order
+        elapsed = post_all(client, orders, token)
+        print(
+            f"{tickets_per_order}-ticket orders: {len(orders) / elapsed:.0f} "
+            f"requests/s, {ticket_count / elapsed:.0f} tickets/s"
+        )
+        print(f"registrations stored: {Registration.objects.count()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--webhooks", type=int, default=2000)
+    parser.add_argument("--tickets-per-order", type=int, default=10)
+    parser.add_argument("--attendees", type=int, default=1500)
+    args = parser.parse_args()
+    main(args.webhooks, args.tickets_per_order, args.attendees)
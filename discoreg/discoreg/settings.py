@@ -166,6 +166,17 @@ DISCORD_SCOPES = [
     # "connections",
 ]
 DISCORD_GUILD_ID = os.environ["DISCORD_GUILD_ID"]
+DISCORD_HTTP_POOL_SIZE = int(os.environ.get("DISCORD_HTTP_POOL_SIZE", "100"))
+DISCORD_HTTP_TIMEOUT_SECONDS = int(os.environ.get("DISCORD_HTTP_TIMEOUT_SECONDS", "10"))
+DISCORD_HTTP_MAX_RETRIES = int(os.environ.get("DISCORD_HTTP_MAX_RETRIES", "5"))
+DISCORD_JOB_BACKOFF_SECONDS = int(os.environ.get("DISCORD_JOB_BACKOFF_SECONDS", "5"))
+DISCORD_JOB_LEASE_SECONDS = int(os.environ.get("DISCORD_JOB_LEASE_SECONDS", "120"))
+DISCORD_JOB_MAX_ATTEMPTS = int(os.environ.get("DISCORD_JOB_MAX_ATTEMPTS", "8"))
+DISCORD_JOB_MAX_BACKOFF_SECONDS = int(
+    os.environ.get("DISCORD_JOB_MAX_BACKOFF_SECONDS", "600")
+)
+DISCORD_WORKER_BATCH_SIZE = int(os.environ.get("DISCORD_WORKER_BATCH_SIZE", "50"))
+DISCORD_WORKER_POLL_SECONDS = float(os.environ.get("DISCORD_WORKER_POLL_SECONDS", "1"))
 DISCORD_BOT_CHANNEL = int(os.environ.get("DISCORD_BOT_CHANNEL", "734788395024515153"))
 DISCORD_BOT_DEBUG_CHANNEL = int(
     os.environ.get("DISCORD_BOT_DEBUG_CHANNEL", "734788395024515153")
@@ -180,11 +191,56 @@ DISCORD_BOT_EVENT_START_DATETIME = os.environ.get(
 DISCORD_BOT_EVENT_END_DATETIME = os.environ.get(
     "DISCORD_BOT_EVENT_END_DATETIME", "2023-12-16T23:59:59-0500"
 )
+# rolebot logs each role grant as a JSON line to stdout (the "nextupbot.audit"
+# logger). Set this to an absolute path on persistent storage to also append
+# them to a file; dyno filesystems are discarded on every restart.
+DISCORD_BOT_AUDIT_LOG = os.environ.get("DISCORD_BOT_AUDIT_LOG")
+DISCORD_BOT_DEBUG_FLUSH_SECONDS = int(
+    os.environ.get("DISCORD_BOT_DEBUG_FLUSH_SECONDS", "30")
+)
+DISCORD_BOT_DEBUG_FLUSH_EVENTS = int(
+    os.environ.get("DISCORD_BOT_DEBUG_FLUSH_EVENTS", "25")
+)
+DISCORD_BOT_MEMBERS_INTENT = os.environ.get("DISCORD_BOT_MEMBERS_INTENT", False) == "1"
+DISCORD_BOT_CLAIM_LEASE_SECONDS = int(
+    os.environ.get("DISCORD_BOT_CLAIM_LEASE_SECONDS", "15")
+)
 DISCORD_BOT_OFFSET_SECONDS = int(os.environ.get("DISCORD_BOT_OFFSET_SECONDS", "0"))
+DISCORD_BOT_SEND_CONCURRENCY = int(os.environ.get("DISCORD_BOT_SEND_CONCURRENCY", "10"))
+DISCORD_BOT_REFRESH_SECONDS = int(os.environ.get("DISCORD_BOT_REFRESH_SECONDS", "60"))
+DISCORD_BOT_RETRY_SECONDS = int(os.environ.get("DISCORD_BOT_RETRY_SECONDS", "5"))
 DISCORD_BOT_TOKEN = os.environ["DISCORD_BOT_TOKEN"]
 DISCORD_BOT_WINDOW_SECONDS = int(os.environ.get("DISCORD_BOT_WINDOW_SECONDS", "30"))
 TITO_WEBHOOK_TOKEN = os.environ["TITO_WEBHOOK_TOKEN"]
+# Each process caches the default roles, so a role change can take this long to
+# reach every web worker.
+DEFAULT_ROLES_CACHE_SECONDS = int(os.environ.get("DEFAULT_ROLES_CACHE_SECONDS", "60"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "audit": {"format": "%(message)s"},
+        "console": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "audit": {"class": "logging.StreamHandler", "formatter": "audit"},
+        "console": {"class": "logging.StreamHandler", "formatter": "console"},
+    },
+    "loggers": {
+        "nextupbot": {
+            "handlers": ["console"],
+            "level": os.environ.get("NEXTUPBOT_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        "nextupbot.audit": {
+            "handlers": ["audit"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
 
 import django_heroku
 
-django_heroku.settings(locals(), allowed_hosts=False)
+django_heroku.settings(locals(), allowed_hosts=False, logging=False)
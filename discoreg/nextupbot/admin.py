@@ -1,7 +1,7 @@
 from django.contrib import admin
 import pytz
 
-from .models import SessionNotification
+from .models import DiscordChannel, NotificationDelivery, SessionNotification
 import pytz
 
 
@@ -9,9 +9,21 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ("send_by_local_time", "sent", "title")
 
 
+class NotificationDeliveryInline(admin.TabularInline):
+    model = NotificationDelivery
+    extra = 0
+    can_delete = False
+    readonly_fields = ("channel", "sent_at")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ("send_by_local_time", "sent", "title")
+    list_display = ("send_by_local_time", "sent", "sent_at", "embed_ok", "title")
     ordering = ("send_by", "title")
+    filter_horizontal = ("channels",)
+    inlines = [NotificationDeliveryInline]
 
     # formfield_overrides = {
     #     models.TextField: {"widget": admin.widgets.AdminTextareaWidget}
@@ -20,6 +32,10 @@ class NotificationAdmin(admin.ModelAdmin):
         local_time = obj.send_by.astimezone(pytz.timezone("US/Eastern"))
         return local_time.strftime("%Y-%m-%d %H:%M:%S")
 
+    @admin.display(boolean=True, description="Embed OK")
+    def embed_ok(self, obj):
+        return bool(obj.embed_json)
+
     def formfield_for_dbfield(self, db_field, **kwargs):
         if db_field.name in [
             "description",
@@ -31,4 +47,5 @@ class NotificationAdmin(admin.ModelAdmin):
         return super().formfield_for_dbfield(db_field, **kwargs)
 
 
+admin.site.register(DiscordChannel)
 admin.site.register(SessionNotification, NotificationAdmin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class NextupbotConfig(AppConfig):
     name = "nextupbot"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+
+
+class ContentStore:
+    """Downloaded files stored once under ``<root>/.objects``, named by SHA-256.
+
+    The digest is taken over the bytes as downloaded, before attribution is
+    added, so the same photo posted in several messages or channels is kept
+    once. Each message's file name is a hard link to the stored copy, or a
+    symlink where the filesystem does not support hard links.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / ".objects"
+
+    def path_for(self, digest, suffix):
+        return self.objects / digest[:2] / f"{digest}{suffix}"
+
+    def add(self, temp_path, digest, suffix):
+        """Move a finished download into the store.
+
+        Returns the stored path and whether the content was new. Content that is
+        already stored is kept and ``temp_path`` is removed.
+        """
+        path = self.path_for(digest, suffix)
+        if path.exists():
+            Path(temp_path).unlink()
+            return path, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+        return path, True
+
+    def link(self, stored_path, file_path):
+        """Give stored content a per-message file name."""
+        file_path = Path(file_path)
+        if file_path.exists() or file_path.is_symlink():
+            return
+        try:
+            os.link(stored_path, file_path)
+        except OSError:
+            file_path.symlink_to(os.path.relpath(stored_path, file_path.parent))
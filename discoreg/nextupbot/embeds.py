@@ -0,0 +1,89 @@
+import json
+import re
+
+from django.core.exceptions import ValidationError
+
+# https://discord.com/developers/docs/resources/message#embed-object-embed-limits
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_FIELD_NAME_LIMIT = 256
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_AUTHOR_NAME_LIMIT = 256
+EMBED_TOTAL_LIMIT = 6000
+
+COLOR_PATTERN = re.compile(r"[0-9a-fA-F]{6}")
+FIELD_NUMBERS = (1, 2, 3)
+
+
+def check_length(errors, field, value, limit):
+    if value and len(value) > limit:
+        errors[field] = f"Discord allows at most {limit} characters here."
+
+
+def build_embed_payload(sn):
+    """Build the Discord embed JSON for a SessionNotification, validating it.
+
+    Raises ValidationError keyed by model field for anything Discord would
+    reject, so problems surface when the notification is edited rather than
+    when it is due to be posted.
+    """
+    errors = {}
+    payload = {"title": sn.title}
+    check_length(errors, "title", sn.title, EMBED_TITLE_LIMIT)
+    if sn.color_hex_string:
+        if COLOR_PATTERN.fullmatch(sn.color_hex_string):
+            payload["color"] = int(sn.color_hex_string, 16)
+        else:
+            errors["color_hex_string"] = "Use a six digit hex colour such as 502962."
+    if sn.url:
+        payload["url"] = sn.url
+    if sn.description:
+        check_length(errors, "description", sn.description, EMBED_DESCRIPTION_LIMIT)
+        payload["description"] = sn.description
+    if sn.author_name:
+        check_length(errors, "author_name", sn.author_name, EMBED_AUTHOR_NAME_LIMIT)
+        payload["author"] = {"name": sn.author_name}
+
+    fields = []
+    for number in FIELD_NUMBERS:
+        name_field = f"field_{number}_name"
+        value_field = f"field_{number}_value"
+        name = getattr(sn, name_field)
+        value = getattr(sn, value_field)
+        if name and not value:
+            errors[value_field] = "Discord requires a value when the name is set."
+        elif value and not name:
+            errors[name_field] = "Discord requires a name when the value is set."
+        if name:
+            check_length(errors, name_field, name, EMBED_FIELD_NAME_LIMIT)
+            check_length(errors, value_field, value, EMBED_FIELD_VALUE_LIMIT)
+            fields.append({"name": name, "value": value or "", "inline": False})
+    if fields:
+        payload["fields"] = fields
+
+    total = sum(
+        len(text or "")
+        for text in [sn.title, sn.description, sn.author_name]
+        + [field["name"] + field["value"] for field in fields]
+    )
+    if total > EMBED_TOTAL_LIMIT:
+        errors["description"] = (
+            f"The embed has {total} characters; Discord allows {EMBED_TOTAL_LIMIT}."
+        )
+
+    if errors:
+        raise ValidationError(errors)
+    return payload
+
+
+def encode_embed(sn):
+    """Return the embed as compact JSON, or an empty string if it is invalid."""
+    try:
+        return json.dumps(build_embed_payload(sn), separators=(",", ":"))
+    except ValidationError:
+        return ""
+
+
+def encode_message(embed_json):
+    """Wrap a pre-encoded embed in a create-message request body."""
+    return f'{{"embeds":[{embed_json}]}}'.encode()
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+# One JSON line per grant. Configured in settings to go to stdout, where the
+# platform's log drains keep it after the dyno's filesystem is discarded.
+audit_logger = logging.getLogger("nextupbot.audit")
+
+# Discord rejects messages longer than this
+MAX_MESSAGE_LENGTH = 2000
+
+
+class GrantLog:
+    """Record role grants without making them wait on Discord.
+
+    Each grant is written straight away as a JSON line to the
+    ``nextupbot.audit`` logger, which is the durable record, and also appended
+    to ``audit_path`` when one is given. Grants are also buffered and posted to
+    the debug channel as one summary every ``flush_seconds``, or sooner once
+    ``flush_events`` have piled up. Summaries are sent by a single background
+    task, so they never compete with the grants themselves for rate limits.
+    """
+
+    def __init__(self, send, audit_path=None, flush_seconds=30, flush_events=25):
+        self.send = send
+        self.audit_file = (
+            open(audit_path, "a", encoding="utf-8", buffering=1) if audit_path else None
+        )
+        self.flush_seconds = flush_seconds
+        self.flush_events = flush_events
+        self.pending = []
+        self.full = asyncio.Event()
+        self.closing = False
+        self.task = None
+
+    def record(self, role, member):
+        line = json.dumps(
+            {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "event": "role_added",
+                "role_id": str(role.id),
+                "member_id": str(member.id),
+                "member": str(member),
+            }
+        )
+        audit_logger.info(line)
+        if self.audit_file:
+            self.audit_file.write(line + "\n")
+        self.pending.append((role.id, member.id))
+        if len(self.pending) >= self.flush_events:
+            self.full.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self.full.clear()
+        grants, self.pending = self.pending, []
+        for text in summarize(grants):
+            try:
+                await self.send(text)
+            except Exception:
+                logger.exception("Could not post role grant summary")
+
+    async def close(self):
+        """Stop the background task, then post whatever is still buffered.
+
+        A summary being sent when this is called is allowed to finish, rather
+        than being cancelled halfway through.
+        """
+        self.closing = True
+        self.full.set()
+        if self.task:
+            await self.task
+            self.task = None
+        await self.flush()
+        if self.audit_file:
+            self.audit_file.close()
+            self.audit_file = None
+
+
+def summarize(grants):
+    """Return summary messages for (role_id, member_id) grants, split to fit."""
+    by_role = {}
+    for role_id, member_id in grants:
+        by_role.setdefault(role_id, []).append(member_id)
+    messages = []
+    for role_id, member_ids in by_role.items():
+        header = f"Added role <@&{role_id}> to {len(member_ids)} members:"
+        text = header
+        for member_id in member_ids:
+            mention = f" <@{member_id}>"
+            if len(text) + len(mention) > MAX_MESSAGE_LENGTH:
+                messages.append(text)
+                text = f"{header} (continued)"
+            text += mention
+        messages.append(text)
+    return messages
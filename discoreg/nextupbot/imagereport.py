@@ -0,0 +1,170 @@
+import csv
+import json
+from pathlib import Path
+
+EXPORT_FIELDS = [
+    "message_id",
+    "channel_id",
+    "channel",
+    "author",
+    "timestamp",
+    "url",
+    "filename",
+    "size",
+    "type",
+]
+
+
+class ImageRecord:
+    """One image found by imagescan, without keeping its discord.Message alive."""
+
+    __slots__ = (
+        "message_id",
+        "channel_id",
+        "channel",
+        "author",
+        "username",
+        "timestamp",
+        "url",
+        "filename",
+        "size",
+        "type",
+        "key",
+        "index",
+        "jump_url",
+        "content",
+    )
+
+    def __init__(
+        self,
+        message_id,
+        channel_id,
+        channel,
+        author,
+        username,
+        timestamp,
+        url,
+        filename,
+        size,
+        type,
+        key,
+        index,
+        jump_url,
+        content=None,
+    ):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.channel = channel
+        self.author = author
+        self.username = username
+        self.timestamp = timestamp
+        self.url = url
+        self.filename = filename
+        self.size = size
+        self.type = type
+        self.key = key
+        self.index = index
+        self.jump_url = jump_url
+        self.content = content
+
+    def export_row(self):
+        # IDs are written as strings, as Discord does, since they overflow
+        # JavaScript numbers.
+        return {
+            "message_id": str(self.message_id),
+            "channel_id": str(self.channel_id),
+            "channel": self.channel,
+            "author": self.author,
+            "timestamp": self.timestamp.isoformat(),
+            "url": self.url,
+            "filename": self.filename,
+            "size": self.size,
+            "type": self.type,
+        }
+
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record.export_row()) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvExporter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=EXPORT_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record.export_row())
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExporter:
+    """Write records in row groups of ``batch_size``. Needs pyarrow installed."""
+
+    def __init__(self, path, batch_size=10_000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(
+                "Parquet export needs pyarrow: pip install 'discoreg[parquet]'"
+            ) from e
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [
+                ("message_id", pyarrow.int64()),
+                ("channel_id", pyarrow.int64()),
+                ("channel", pyarrow.string()),
+                ("author", pyarrow.string()),
+                ("timestamp", pyarrow.timestamp("ms", tz="UTC")),
+                ("url", pyarrow.string()),
+                ("filename", pyarrow.string()),
+                ("size", pyarrow.int64()),
+                ("type", pyarrow.string()),
+            ]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append({field: getattr(record, field) for field in EXPORT_FIELDS})
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            table = self.pyarrow.Table.from_pylist(self.rows, schema=self.schema)
+            self.writer.write_table(table)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+EXPORTERS = {
+    "jsonl": JsonLinesExporter,
+    "csv": CsvExporter,
+    "parquet": ParquetExporter,
+}
+
+
+def open_exporter(path, export_format=None):
+    """Open an exporter for ``path``, choosing the format from its extension."""
+    export_format = export_format or Path(path).suffix.lstrip(".").lower()
+    if export_format not in EXPORTERS:
+        raise ValueError(
+            f"Unknown export format '{export_format}', use one of "
+            f"{', '.join(EXPORTERS)}"
+        )
+    return EXPORTERS[export_format](path)
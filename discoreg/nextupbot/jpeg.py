@@ -0,0 +1,324 @@
+import os
+import struct
+
+import piexif
+
+SOI = b"\xff\xd8"
+SOS = 0xDA
+APP0 = 0xE0
+APP1 = 0xE1
+APP13 = 0xED
+STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+EXIF_HEADER = b"Exif\x00\x00"
+PHOTOSHOP_HEADER = b"Photoshop 3.0\x00"
+IPTC_RESOURCE_ID = 0x0404
+MAX_SEGMENT_PAYLOAD = 0xFFFF - 2
+
+# Header segments (everything before the image data) are buffered so existing
+# EXIF and IPTC blocks can be merged. Files whose header is larger than this are
+# passed through untouched rather than buffered without bound.
+MAX_HEADER_BYTES = 1024 * 1024
+
+IPTC_OBJECT_NAME = 5
+IPTC_BY_LINE = 80
+IPTC_COPYRIGHT_NOTICE = 116
+IPTC_CAPTION = 120
+
+
+class Attribution:
+    """Who posted a photo, and when, for writing into its EXIF and IPTC data."""
+
+    def __init__(self, author_name, message_id, message_timestamp):
+        self.author_name = author_name
+        self.message_id = message_id
+        self.message_timestamp = message_timestamp
+
+    def exif(self, existing=None):
+        """Return an EXIF block with attribution added to ``existing``.
+
+        Fields already present in the photo are kept as they are.
+        """
+        try:
+            exif_dict = piexif.load(existing) if existing else None
+        except (piexif.InvalidImageDataError, ValueError, struct.error):
+            exif_dict = None
+        if exif_dict is None:
+            exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+        exif_dict.setdefault("0th", {})
+        exif_dict.setdefault("Exif", {})
+
+        exif_datetime = self.message_timestamp.strftime("%Y:%m:%d %H:%M:%S")
+        image_ifd = exif_dict["0th"]
+        image_ifd.setdefault(
+            piexif.ImageIFD.Artist,
+            f"Discord user: {self.author_name} (Message ID: {self.message_id})",
+        )
+        image_ifd.setdefault(
+            piexif.ImageIFD.Copyright, f"Uploaded by {self.author_name}"
+        )
+        image_ifd.setdefault(
+            piexif.ImageIFD.ImageDescription,
+            f"Photo from PyOhio by Discord user: {self.author_name}",
+        )
+        image_ifd.setdefault(piexif.ImageIFD.DateTime, exif_datetime)
+        exif_dict["Exif"].setdefault(piexif.ExifIFD.DateTimeOriginal, exif_datetime)
+
+        exif = piexif.dump(exif_dict)
+        if len(exif) > MAX_SEGMENT_PAYLOAD and exif_dict.get("thumbnail"):
+            # The embedded thumbnail is what usually pushes EXIF over the limit.
+            exif_dict["1st"] = {}
+            exif_dict["thumbnail"] = None
+            exif = piexif.dump(exif_dict)
+        if len(exif) > MAX_SEGMENT_PAYLOAD:
+            raise ValueError("EXIF data does not fit in a JPEG segment")
+        return exif
+
+    def iptc_datasets(self):
+        return {
+            IPTC_OBJECT_NAME: f"PyOhio photo by {self.author_name}",
+            IPTC_CAPTION: f"Photo from PyOhio by Discord user: {self.author_name}",
+            IPTC_BY_LINE: self.author_name,
+            IPTC_COPYRIGHT_NOTICE: f"Uploaded by {self.author_name}",
+        }
+
+    def photoshop(self, existing=None):
+        """Return an APP13 Photoshop block with attribution in its IPTC record.
+
+        Other Photoshop resources, and IPTC datasets other than the four set
+        here, are preserved.
+        """
+        resources = parse_photoshop_resources(existing) if existing else []
+        old_iptc = b""
+        for resource_id, _, data in resources:
+            if resource_id == IPTC_RESOURCE_ID:
+                old_iptc = data
+        iptc = encode_iptc(self.iptc_datasets(), old_iptc)
+        resources = [r for r in resources if r[0] != IPTC_RESOURCE_ID]
+        resources.append((IPTC_RESOURCE_ID, b"", iptc))
+        block = PHOTOSHOP_HEADER + b"".join(
+            encode_photoshop_resource(*resource) for resource in resources
+        )
+        if len(block) > MAX_SEGMENT_PAYLOAD:
+            raise ValueError("IPTC data does not fit in a JPEG segment")
+        return block
+
+
+def parse_photoshop_resources(block):
+    """Split an APP13 payload into (resource_id, name, data) tuples."""
+    resources = []
+    position = len(PHOTOSHOP_HEADER)
+    while position + 12 <= len(block) and block[position : position + 4] == b"8BIM":
+        (resource_id,) = struct.unpack(">H", block[position + 4 : position + 6])
+        name_length = block[position + 6]
+        name_end = position + 7 + name_length
+        name = block[position + 7 : name_end]
+        if (name_length + 1) % 2:
+            name_end += 1
+        (size,) = struct.unpack(">I", block[name_end : name_end + 4])
+        data = block[name_end + 4 : name_end + 4 + size]
+        resources.append((resource_id, name, data))
+        position = name_end + 4 + size + size % 2
+    return resources
+
+
+def encode_photoshop_resource(resource_id, name, data):
+    name_field = bytes([len(name)]) + name
+    if len(name_field) % 2:
+        name_field += b"\x00"
+    padding = b"\x00" * (len(data) % 2)
+    return (
+        b"8BIM"
+        + struct.pack(">H", resource_id)
+        + name_field
+        + struct.pack(">I", len(data))
+        + data
+        + padding
+    )
+
+
+def encode_iptc(datasets, existing=b""):
+    """Encode IPTC-IIM record 2 datasets, keeping unrelated existing ones."""
+    kept = []
+    position = 0
+    while position + 5 <= len(existing) and existing[position] == 0x1C:
+        record, dataset = existing[position + 1], existing[position + 2]
+        (length,) = struct.unpack(">H", existing[position + 3 : position + 5])
+        if length & 0x8000:
+            # Extended datasets are only used for huge binary records.
+            break
+        end = position + 5 + length
+        if not (record == 2 and (dataset in datasets or dataset == 0)) and not (
+            record == 1 and dataset == 90
+        ):
+            kept.append(existing[position:end])
+        position = end
+
+    encoded = [
+        # Coded character set: UTF-8
+        encode_iptc_dataset(1, 90, b"\x1b%G"),
+        # Record version
+        encode_iptc_dataset(2, 0, b"\x00\x04"),
+    ]
+    encoded += [
+        encode_iptc_dataset(2, dataset, value.encode("utf-8"))
+        for dataset, value in datasets.items()
+    ]
+    return b"".join(encoded + kept)
+
+
+def encode_iptc_dataset(record, dataset, value):
+    return bytes([0x1C, record, dataset]) + struct.pack(">H", len(value)) + value
+
+
+def encode_segment(marker, payload):
+    return bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+class JpegAttributionWriter:
+    """Rewrite a JPEG as it streams through, adding attribution metadata.
+
+    Feed it the file in chunks and write out whatever it returns. Only the
+    header segments ahead of the image data are held in memory; everything from
+    the start of scan onwards is passed straight through. Anything that is not
+    a JPEG, or that cannot be parsed, is passed through unchanged.
+    """
+
+    def __init__(self, attribution):
+        self.attribution = attribution
+        self.buffer = bytearray()
+        self.passthrough = False
+        self.tagged = False
+
+    def feed(self, chunk):
+        if self.passthrough:
+            return chunk
+        self.buffer += chunk
+        if len(self.buffer) < 2:
+            return b""
+        if not self.buffer.startswith(SOI):
+            return self.release()
+        output = self.rewrite_header()
+        if output is None and len(self.buffer) > MAX_HEADER_BYTES:
+            return self.release()
+        return output or b""
+
+    def close(self):
+        """Return any buffered bytes once the input is exhausted."""
+        if self.passthrough:
+            return b""
+        return self.release()
+
+    def release(self):
+        self.passthrough = True
+        output = bytes(self.buffer)
+        self.buffer = bytearray()
+        return output
+
+    def rewrite_header(self):
+        """Rewrite the buffered header once the start of scan has arrived.
+
+        Returns None while the header is still incomplete.
+        """
+        segments = []
+        position = 2
+        buffer = self.buffer
+        while True:
+            if position + 2 > len(buffer):
+                return None
+            if buffer[position] != 0xFF:
+                return self.release()
+            marker = buffer[position + 1]
+            if marker == 0xFF:
+                # Fill byte before a marker
+                position += 1
+                continue
+            if marker in STANDALONE_MARKERS:
+                segments.append((marker, None))
+                position += 2
+                continue
+            if marker == SOS:
+                break
+            if position + 4 > len(buffer):
+                return None
+            (length,) = struct.unpack(">H", buffer[position + 2 : position + 4])
+            if length < 2:
+                return self.release()
+            end = position + 2 + length
+            if end > len(buffer):
+                return None
+            segments.append((marker, bytes(buffer[position + 4 : end])))
+            position = end
+
+        try:
+            header = self.tag_segments(segments)
+        except Exception:
+            return self.release()
+        self.tagged = True
+        output = header + bytes(buffer[position:])
+        self.passthrough = True
+        self.buffer = bytearray()
+        return output
+
+    def tag_segments(self, segments):
+        exif_index = photoshop_index = None
+        for index, (marker, payload) in enumerate(segments):
+            if payload is None:
+                continue
+            if (
+                marker == APP1
+                and payload.startswith(EXIF_HEADER)
+                and exif_index is None
+            ):
+                exif_index = index
+            if marker == APP13 and payload.startswith(PHOTOSHOP_HEADER):
+                photoshop_index = index
+
+        segments = list(segments)
+        if exif_index is None:
+            # EXIF goes right after SOI, or after the JFIF APP0 segment.
+            exif_index = 1 if segments and segments[0][0] == APP0 else 0
+            segments.insert(exif_index, (APP1, None))
+            if photoshop_index is not None and photoshop_index >= exif_index:
+                photoshop_index += 1
+        segments[exif_index] = (APP1, self.attribution.exif(segments[exif_index][1]))
+        if photoshop_index is None:
+            segments.append((APP13, None))
+            photoshop_index = len(segments) - 1
+        segments[photoshop_index] = (
+            APP13,
+            self.attribution.photoshop(segments[photoshop_index][1]),
+        )
+
+        header = bytearray(SOI)
+        for marker, payload in segments:
+            if payload is None:
+                header += bytes([0xFF, marker])
+            else:
+                header += encode_segment(marker, payload)
+        return bytes(header)
+
+
+def is_jpeg(data):
+    return data.startswith(SOI)
+
+
+def tag_file(path, attribution, chunk_size=64 * 1024):
+    """Add attribution to the JPEG at ``path`` in place, streaming it through.
+
+    Runs in worker processes, so it only deals in paths and picklable values.
+    Returns True if the file was tagged.
+    """
+    tagged_path = f"{path}.tagged"
+    writer = JpegAttributionWriter(attribution)
+    try:
+        with open(path, "rb") as source, open(tagged_path, "wb") as target:
+            while chunk := source.read(chunk_size):
+                target.write(writer.feed(chunk))
+            target.write(writer.close())
+        if writer.tagged:
+            os.replace(tagged_path, path)
+    finally:
+        if os.path.exists(tagged_path):
+            os.unlink(tagged_path)
+    return writer.tagged
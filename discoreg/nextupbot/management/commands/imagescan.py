@@ -1,60 +1,120 @@
 import asyncio
+import hashlib
 import os
-from datetime import datetime, timedelta
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
 from pathlib import Path
 from typing import Optional
 
 import discord
 import aiohttp
 import typer
-import piexif
-from iptcinfo3 import IPTCInfo
 from django.conf import settings
 from django_typer.management import TyperCommand
 from rich.console import Console
 from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.progress import (
+    DownloadColumn,
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TransferSpeedColumn,
+)
+
+from nextupbot.contentstore import ContentStore
+from nextupbot.imagereport import EXPORTERS, ImageRecord, open_exporter
+from nextupbot.jpeg import Attribution, is_jpeg, tag_file
+from nextupbot.resthistory import (
+    GUILD_CATEGORY,
+    RestChannel,
+    archived_threads,
+    channel_messages,
+)
+from nextupbot.scanstate import ChannelCursor, ScanState
+from registrations.discord_api import DiscordAPIError, DiscordClient
 
 
 console = Console()
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 
 class Command(TyperCommand):
     """
     Discord bot that scans channels for posts containing images.
     
-    This command connects to Discord and scans a specified channel for messages
-    containing images. It can list image metadata and optionally download the
-    images to a local directory.
+    This command connects to Discord and scans the specified channels, categories
+    or a whole guild for messages containing images. It can list image metadata
+    and optionally download the images to a local directory.
     
     Examples:
-        # Scan last 100 messages in a channel
+        # Scan the last year of messages in a channel
         python manage.py imagescan 123456789012345678
         
-        # Scan 500 messages
+        # Scan only the 500 most recent messages
         python manage.py imagescan 123456789012345678 --limit 500
+
+        # Scan a single day
+        python manage.py imagescan 123456789012345678 --from-date 2025-07-26 --to-date 2025-07-26
         
         # Download images to default directory
         python manage.py imagescan 123456789012345678 --download
         
         # Download to custom directory
         python manage.py imagescan 123456789012345678 --download --download-dir /path/to/save
+
+        # Download up to 16 images at a time
+        python manage.py imagescan 123456789012345678 --download --concurrency 16
+
+        # Downloads remember how far each channel was scanned, so rerunning only
+        # fetches newer messages. Start again from --from-date with:
+        python manage.py imagescan 123456789012345678 --download --no-resume
+
+        # Scan several channels, or every channel in a category, with their threads
+        python manage.py imagescan 123456789012345678 234567890123456789 --download
+
+        # Archive every channel and thread in a guild (server)
+        python manage.py imagescan --guild 345678901234567890 --download
+
+        # Write one record per image as it is found, without the table
+        python manage.py imagescan --guild 345678901234567890 \
+            --export images.jsonl --no-table
+
+        # Page history over the REST API without logging in to the gateway
+        python manage.py imagescan --guild 345678901234567890 --download --rest
     """
     
     help = "Scan Discord channels for messages containing images"
     
     def handle(
         self,
-        channel_id: str = typer.Argument(
-            ..., 
-            help="Discord channel ID to scan for images"
+        channel_ids: Optional[list[str]] = typer.Argument(
+            None,
+            help="Discord channel, thread or category IDs to scan for images"
         ),
-        limit: int = typer.Option(
-            100,
+        guild: Optional[str] = typer.Option(
+            None,
+            "--guild", "-g",
+            help="Scan every channel in this guild (server)"
+        ),
+        threads: bool = typer.Option(
+            True,
+            "--threads/--no-threads",
+            help="Include active and archived threads of the scanned channels"
+        ),
+        channel_concurrency: int = typer.Option(
+            4,
+            "--channel-concurrency",
+            help="Maximum number of channels to page through at once",
+            min=1,
+        ),
+        limit: Optional[int] = typer.Option(
+            None,
             "--limit", "-l",
-            help="Number of messages to scan",
+            help="Maximum number of messages to scan. Defaults to every message in the date range.",
             min=1,
-            max=1000,
         ),
         download: bool = typer.Option(
             False,
@@ -66,6 +126,32 @@ class Command(TyperCommand):
             "--download-dir", "-o",
             help="Directory to save downloaded images"
         ),
+        concurrency: int = typer.Option(
+            8,
+            "--concurrency", "-c",
+            help="Maximum number of images to download at once",
+            min=1,
+        ),
+        tag_workers: Optional[int] = typer.Option(
+            None,
+            "--tag-workers",
+            help="Processes adding EXIF/IPTC attribution to downloaded JPEGs. Defaults to the CPU count.",
+            min=1,
+        ),
+        resume: bool = typer.Option(
+            True,
+            "--resume/--no-resume",
+            help=(
+                "When downloading, continue after the last message scanned by a "
+                "previous run that started at or before --from-date. "
+                "Ignored with --limit, which always scans the newest messages"
+            ),
+        ),
+        state_file: Optional[str] = typer.Option(
+            None,
+            "--state-file",
+            help="SQLite file recording scan progress. Defaults to .imagescan.sqlite3 in the download directory."
+        ),
         show_embeds: bool = typer.Option(
             True,
             "--show-embeds/--no-embeds",
@@ -76,6 +162,32 @@ class Command(TyperCommand):
             "--verbose", "-v",
             help="Show detailed output including message content"
         ),
+        table: bool = typer.Option(
+            True,
+            "--table/--no-table",
+            help="Show a table of the images found once the scan finishes"
+        ),
+        export: Optional[str] = typer.Option(
+            None,
+            "--export",
+            help="Write a record for each image to this file as it is found"
+        ),
+        export_format: Optional[str] = typer.Option(
+            None,
+            "--export-format",
+            help=(
+                f"Export format ({', '.join(EXPORTERS)}). "
+                "Defaults to the --export file extension."
+            )
+        ),
+        rest: bool = typer.Option(
+            False,
+            "--rest/--gateway",
+            help=(
+                "Read channels and history over the REST API alone, skipping the "
+                "gateway login and cache warm-up"
+            )
+        ),
         from_date: Optional[str] = typer.Option(
             None,
             "--from-date",
@@ -84,40 +196,72 @@ class Command(TyperCommand):
         to_date: Optional[str] = typer.Option(
             None,
             "--to-date",
-            help="Filter messages up to this date (YYYYMMDD or YYYY-MM-DD). Defaults to now."
+            help="Filter messages up to and including this date (YYYYMMDD or YYYY-MM-DD). Defaults to now."
         ),
     ):
         """
-        Scan a Discord channel for messages containing images.
+        Scan Discord channels for messages containing images.
         
         This command will:
         - Connect to Discord using the bot token
-        - Scan the specified channel for messages with images
+        - Scan the specified channels concurrently for messages with images
         - Display information about found images
         - Optionally download images to a local directory
         """
+        channel_id_ints = []
+        for channel_id in channel_ids or []:
+            try:
+                channel_id_ints.append(int(channel_id))
+            except ValueError:
+                console.print(f"[red]Error: Invalid channel ID '{channel_id}'[/red]")
+                raise typer.Exit(1)
         try:
-            channel_id_int = int(channel_id)
+            guild_id = int(guild) if guild else None
         except ValueError:
-            console.print(f"[red]Error: Invalid channel ID '{channel_id}'[/red]")
+            console.print(f"[red]Error: Invalid guild ID '{guild}'[/red]")
+            raise typer.Exit(1)
+        if not channel_id_ints and guild_id is None:
+            console.print("[red]Error: Give at least one channel ID or --guild[/red]")
             raise typer.Exit(1)
         
         # Parse date filters
         from_dt, to_dt = self.parse_date_filters(from_date, to_date)
-            
-        asyncio.run(self.run_bot(
-            channel_id_int,
-            limit,
-            download,
-            download_dir,
-            show_embeds,
-            verbose,
-            from_dt,
-            to_dt
-        ))
+
+        exporter = None
+        if export:
+            try:
+                exporter = open_exporter(export, export_format)
+            except (ValueError, ImportError) as e:
+                console.print(f"[red]Error: {e}[/red]")
+                raise typer.Exit(1)
+
+        try:
+            asyncio.run(self.run_bot(
+                channel_id_ints,
+                guild_id,
+                threads,
+                channel_concurrency,
+                limit,
+                download,
+                download_dir,
+                concurrency,
+                tag_workers,
+                resume,
+                state_file,
+                show_embeds,
+                verbose,
+                table,
+                exporter,
+                rest,
+                from_dt,
+                to_dt
+            ))
+        finally:
+            if exporter:
+                exporter.close()
 
     def parse_date_filters(self, from_date: Optional[str], to_date: Optional[str]) -> tuple[Optional[datetime], Optional[datetime]]:
-        """Parse date filter arguments into datetime objects"""
+        """Parse date filter arguments into UTC datetimes, with ``to_dt`` exclusive"""
         from_dt = None
         to_dt = None
         
@@ -126,11 +270,11 @@ class Command(TyperCommand):
             from_dt = self.parse_date_string(from_date)
         else:
             # Default to 1 year ago
-            from_dt = datetime.now() - timedelta(days=365)
+            from_dt = datetime.now(timezone.utc) - timedelta(days=365)
         
         # Parse to_date
         if to_date:
-            to_dt = self.parse_date_string(to_date)
+            to_dt = self.parse_date_string(to_date) + timedelta(days=1)
         
         return from_dt, to_dt
     
@@ -147,240 +291,448 @@ class Command(TyperCommand):
             year = int(clean_date[0:4])
             month = int(clean_date[4:6])
             day = int(clean_date[6:8])
-            return datetime(year, month, day)
+            return datetime(year, month, day, tzinfo=timezone.utc)
         except ValueError:
             console.print(f"[red]Error: Invalid date '{date_str}'[/red]")
             raise typer.Exit(1)
 
     async def run_bot(
         self, 
-        channel_id: int,
-        limit: int,
+        channel_ids: list[int],
+        guild_id: Optional[int],
+        threads: bool,
+        channel_concurrency: int,
+        limit: Optional[int],
         download: bool,
         download_dir: str,
+        concurrency: int,
+        tag_workers: Optional[int],
+        resume: bool,
+        state_file: Optional[str],
         show_embeds: bool,
         verbose: bool,
+        table: bool,
+        exporter,
+        rest: bool,
         from_dt: Optional[datetime],
         to_dt: Optional[datetime]
     ):
-        intents = discord.Intents.default()
-        intents.message_content = True
-        
-        client = ImageScannerClient(
-            channel_id=channel_id,
-            limit=limit,
-            download=download,
-            download_dir=download_dir,
-            show_embeds=show_embeds,
-            verbose=verbose,
-            from_dt=from_dt,
-            to_dt=to_dt,
-        )
-        
+        options = {
+            'channel_ids': channel_ids,
+            'guild_id': guild_id,
+            'include_threads': threads,
+            'channel_concurrency': channel_concurrency,
+            'limit': limit,
+            'download': download,
+            'download_dir': download_dir,
+            'concurrency': concurrency,
+            'tag_workers': tag_workers,
+            'resume': resume,
+            'state_file': state_file,
+            'show_embeds': show_embeds,
+            'verbose': verbose,
+            'table': table,
+            'exporter': exporter,
+            'from_dt': from_dt,
+            'to_dt': to_dt,
+        }
+
         token = os.environ.get("DISCORD_BOT_TOKEN", settings.DISCORD_BOT_TOKEN)
         if not token:
             console.print("[red]Error: DISCORD_BOT_TOKEN not found in environment[/red]")
             raise typer.Exit(1)
-            
-        await client.start(token)
 
+        if rest:
+            await RestImageScanner(token, **options).run()
+        else:
+            await ImageScannerClient(**options).start(token)
 
-class ImageScannerClient(discord.Client):
-    def __init__(self, channel_id, limit, download, download_dir, show_embeds, verbose, from_dt, to_dt, **kwargs):
-        intents = discord.Intents.default()
-        intents.message_content = True
-        super().__init__(intents=intents)
-        self.channel_id = channel_id
+
+class ImageScanner:
+    """Find images in channel history, then report, export and download them.
+
+    Subclasses supply the channels to scan and a way to page their history.
+    """
+
+    def __init__(
+        self,
+        channel_ids,
+        guild_id,
+        include_threads,
+        channel_concurrency,
+        limit,
+        download,
+        download_dir,
+        concurrency,
+        tag_workers,
+        resume,
+        state_file,
+        show_embeds,
+        verbose,
+        table,
+        exporter,
+        from_dt,
+        to_dt,
+    ):
+        self.channel_ids = channel_ids
+        self.guild_id = guild_id
+        self.include_threads = include_threads
+        self.channel_concurrency = channel_concurrency
+        self.channels_scanned = 0
         self.limit = limit
         self.download = download
         self.download_dir = download_dir
+        self.concurrency = concurrency
+        self.tag_workers = tag_workers or os.cpu_count() or 1
+        self.resume = resume
+        self.state_file = state_file or str(Path(download_dir) / ".imagescan.sqlite3")
+        self.state = None
+        self.store = ContentStore(download_dir)
+        self.bytes_saved = 0
+        self.download_results = Counter()
+        # Slim per-image records, kept only for the table view
+        self.image_records = []
+        self.messages_with_images = 0
+        self.messages_scanned = 0
+        self.image_count = 0
         self.show_embeds = show_embeds
         self.verbose = verbose
+        self.table = table
+        self.exporter = exporter
         self.from_dt = from_dt
         self.to_dt = to_dt
-        self.processed = False
 
-    async def on_ready(self):
-        console.print(f"[green]✓[/green] Logged in as {self.user}")
-        
-        if not self.processed:
-            await self.scan_channel()
-            self.processed = True
-            await self.close()
+    async def scan_channels(self):
+        columns = [SpinnerColumn(), TextColumn("[progress.description]{task.description}")]
+        if self.download:
+            columns += [DownloadColumn(), TransferSpeedColumn()]
 
-    async def scan_channel(self):
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console,
-        ) as progress:
-            task = progress.add_task("Fetching channel...", total=None)
-            
-            channel = self.get_channel(self.channel_id)
-            if not channel:
-                console.print(f"[red]✗ Channel {self.channel_id} not found[/red]")
-                return
-
-            progress.update(task, description=f"Scanning #{channel.name}...")
-            
-            # Show date range info
-            if self.from_dt or self.to_dt:
-                date_info = []
-                if self.from_dt:
-                    date_info.append(f"from {self.from_dt.strftime('%Y-%m-%d')}")
-                if self.to_dt:
-                    date_info.append(f"to {self.to_dt.strftime('%Y-%m-%d')}")
-                console.print(f"[yellow]📅 Date filter: {' '.join(date_info)}[/yellow]")
-            
-            if self.download:
-                Path(self.download_dir).mkdir(exist_ok=True)
-                console.print(f"[yellow]📁 Download directory:[/yellow] {self.download_dir}")
-
-            image_count = 0
-            messages_with_images = []
-            messages_scanned = 0
-
-            async for message in channel.history(limit=self.limit):
-                messages_scanned += 1
-                
-                # Apply date filters (convert message timestamp to naive datetime for comparison)
-                message_dt = message.created_at.replace(tzinfo=None)
-                if self.from_dt and message_dt < self.from_dt:
-                    continue
-                if self.to_dt and message_dt > self.to_dt:
+        # One pooled session is shared by every download. Downloads run in worker
+        # tasks fed from a queue, so discord.py fetches the next page of history
+        # while the images from the previous page are still downloading.
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            with Progress(*columns, console=console) as progress:
+                task = progress.add_task("Finding channels...", total=None)
+                channels = await self.resolve_channels()
+                if not channels:
+                    console.print("[red]✗ No channels found to scan[/red]")
+                    return
+                console.print(f"[yellow]🔎 Scanning {len(channels)} channels[/yellow]")
+
+                # Show date range info
+                if self.from_dt or self.to_dt:
+                    date_info = []
+                    if self.from_dt:
+                        date_info.append(f"from {self.from_dt.strftime('%Y-%m-%d')}")
+                    if self.to_dt:
+                        date_info.append(f"to {(self.to_dt - timedelta(days=1)).strftime('%Y-%m-%d')}")
+                    console.print(f"[yellow]📅 Date filter: {' '.join(date_info)}[/yellow]")
+
+                if self.download:
+                    Path(self.download_dir).mkdir(exist_ok=True)
+                    console.print(f"[yellow]📁 Download directory:[/yellow] {self.download_dir}")
+                    self.state = ScanState(self.state_file)
+
+                queue = asyncio.Queue(maxsize=self.concurrency * 4)
+                workers = []
+                tag_workers = []
+                if self.download:
+                    # Downloaded JPEGs are tagged with attribution in a process
+                    # pool, so CPU-bound metadata work runs on every core while
+                    # the download workers carry on fetching.
+                    pool = ProcessPoolExecutor(max_workers=self.tag_workers)
+                    tag_queue = asyncio.Queue(maxsize=self.tag_workers * 4)
+                    tag_task = progress.add_task("Tagging metadata...", total=None)
+                    workers = [
+                        asyncio.create_task(self.download_worker(session, queue, tag_queue, progress, task))
+                        for _ in range(self.concurrency)
+                    ]
+                    tag_workers = [
+                        asyncio.create_task(self.tag_worker(pool, tag_queue, progress, tag_task))
+                        for _ in range(self.tag_workers)
+                    ]
+
+                # Channels are paged concurrently up to --channel-concurrency.
+                # Both discord.py's HTTP client and DiscordClient track rate
+                # limits for the whole session, so every channel shares them.
+                limiter = asyncio.Semaphore(self.channel_concurrency)
+                try:
+                    await asyncio.gather(*(
+                        self.scan_history(channel, limiter, progress, task, queue, len(channels))
+                        for channel in channels
+                    ))
+                finally:
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+                    for _ in tag_workers:
+                        await tag_queue.put(None)
+                    await asyncio.gather(*tag_workers)
+                    if self.download:
+                        pool.shutdown()
+                    if self.state:
+                        self.state.close()
+
+        self.print_report(channels)
+
+    async def download_worker(self, session, queue, tag_queue, progress, task):
+        """Download queued images until the scan sends a None sentinel"""
+        while (item := await queue.get()) is not None:
+            record, cursor = item
+            # Any error is recorded against this image so the worker keeps
+            # draining the queue; otherwise the scan would block on queue.put.
+            try:
+                result, fetched = await self.download_image(
+                    session,
+                    record.url,
+                    record.filename,
+                    record.message_id,
+                    record.username,
+                    record.timestamp,
+                    record.index,
+                    on_chunk=lambda size: progress.update(task, advance=size),
+                    key=record.key,
+                    channel_id=record.channel_id,
+                    expected_size=record.size,
+                )
+                if fetched is not None:
+                    await tag_queue.put((fetched, cursor))
                     continue
-                    
-                has_images = False
-                images = []
-
-                # Check attachments
-                for attachment in message.attachments:
-                    if any(attachment.filename.lower().endswith(ext) 
-                           for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp']):
-                        has_images = True
-                        images.append({
-                            'url': attachment.url,
-                            'filename': attachment.filename,
-                            'size': attachment.size,
-                            'type': 'attachment'
-                        })
-
-                # Check embeds if enabled
-                if self.show_embeds:
-                    for embed in message.embeds:
-                        if embed.image:
-                            has_images = True
-                            images.append({
-                                'url': embed.image.url,
-                                'filename': f"embed_image_{message.id}_{len(images)}.png",
-                                'size': None,
-                                'type': 'embed'
-                            })
-                        if embed.thumbnail:
-                            has_images = True
-                            images.append({
-                                'url': embed.thumbnail.url,
-                                'filename': f"embed_thumb_{message.id}_{len(images)}.png",
-                                'size': None,
-                                'type': 'embed_thumb'
-                            })
-
-                if has_images:
-                    messages_with_images.append({
-                        'message': message,
-                        'images': images,
-                    })
-                    image_count += len(images)
-
-            progress.update(task, description="Creating report...")
+            except Exception as e:
+                console.print(f"[red]Error downloading {record.filename}: {str(e)}[/red]")
+                result = 'failed'
+            finally:
+                queue.task_done()
+            self.download_results[result] += 1
+            if cursor:
+                cursor.done(record.message_id, ok=result != 'failed')
+
+    async def tag_worker(self, pool, tag_queue, progress, task):
+        """Tag downloaded JPEGs in the process pool, then move them into the store"""
+        loop = asyncio.get_running_loop()
+        while (item := await tag_queue.get()) is not None:
+            fetched, cursor = item
+            # Content that is already stored was tagged when it was first downloaded
+            if fetched.is_jpeg and not self.store.path_for(fetched.sha256, fetched.suffix).exists():
+                try:
+                    await loop.run_in_executor(pool, tag_file, str(fetched.temp_path), fetched.attribution)
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Could not add metadata to {fetched.file_path.name}: {str(e)}[/yellow]")
+            try:
+                result = self.store_image(fetched)
+            except Exception as e:
+                console.print(f"[red]Error saving {fetched.file_path.name}: {str(e)}[/red]")
+                fetched.temp_path.unlink(missing_ok=True)
+                result = 'failed'
+            self.download_results[result] += 1
+            if cursor:
+                cursor.done(fetched.message_id, ok=result != 'failed')
+            progress.update(task, advance=fetched.size)
+
+    def store_image(self, fetched):
+        """Move a finished download into the content store and link its file name"""
+        stored_path, is_new = self.store.add(fetched.temp_path, fetched.sha256, fetched.suffix)
+        self.store.link(stored_path, fetched.file_path)
+        if self.state and fetched.key:
+            self.state.record_download(
+                fetched.key, fetched.channel_id, fetched.message_id, stored_path, fetched.sha256, fetched.size
+            )
+        if not is_new:
+            self.bytes_saved += fetched.size
+            return 'duplicate'
+        return 'downloaded'
+
+    async def scan_history(self, channel, limiter, progress, task, queue, channel_count):
+        """Page through a channel, queueing images for download as they are found"""
+        async with limiter:
+            try:
+                await self.scan_channel_history(channel, progress, task, queue)
+            except (discord.Forbidden, DiscordAPIError) as e:
+                if e.status != 403:
+                    raise
+                console.print(f"[yellow]Warning: No access to message history in #{channel.name}[/yellow]")
+        self.channels_scanned += 1
+        if self.channels_scanned == channel_count:
+            progress.update(task, description="Finishing downloads..." if self.download else "Creating report...")
+        else:
+            progress.update(
+                task,
+                description=f"Scanned {self.channels_scanned}/{channel_count} channels... {self.image_count} images"
+            )
+
+    async def scan_channel_history(self, channel, progress, task, queue):
+        # Bound the history by message IDs so Discord returns only the date range
+        # and paging stops at its edges, rather than filtering after fetching.
+        after_id, before_id = self.snowflake_bounds()
+        # Listings page newest first, so --limit keeps the most recent messages.
+        # discord.py would otherwise page oldest first whenever `after` is set.
+        history_kwargs = {
+            'limit': self.limit,
+            'before': before_id,
+            'oldest_first': False,
+        }
+        cursor = None
+        if self.download and not self.limit:
+            # Archive runs page oldest first from the saved cursor, so an
+            # interrupted run picks up where it stopped and a run with nothing
+            # new costs a single history request. With --limit the newest
+            # messages are wanted instead, which leaves gaps no cursor can
+            # describe, so those runs neither use nor move it.
+            cursor = ChannelCursor(self.state, channel.id)
+            if self.resume:
+                after_id = self.state.resume_from(channel.id, after_id or 0)
+            else:
+                self.state.reset_cursor(channel.id, after_id or 0)
+            history_kwargs['oldest_first'] = True
+        history_kwargs['after'] = after_id
+
+        async for message in self.channel_history(channel, **history_kwargs):
+            self.messages_scanned += 1
+
+            images = []
+
+            # Check attachments
+            for attachment in message.attachments:
+                if any(attachment.filename.lower().endswith(ext)
+                       for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp']):
+                    images.append((str(attachment.id), attachment.url, attachment.filename, attachment.size, 'attachment'))
 
+            # Check embeds if enabled
+            if self.show_embeds:
+                for embed in message.embeds:
+                    if embed.image:
+                        filename = f"embed_image_{message.id}_{len(images)}.png"
+                        images.append((embed.image.url, embed.image.url, filename, None, 'embed'))
+                    if embed.thumbnail:
+                        filename = f"embed_thumb_{message.id}_{len(images)}.png"
+                        images.append((embed.thumbnail.url, embed.thumbnail.url, filename, None, 'embed_thumb'))
+
+            if not images:
+                if cursor:
+                    cursor.add(message.id)
+                continue
+
+            self.messages_with_images += 1
+            self.image_count += len(images)
+            if cursor:
+                cursor.add(message.id, len(images))
+
+            content = None
+            if self.verbose and self.table:
+                content = message.content[:50] + "..." if len(message.content) > 50 else message.content
+            for index, (key, url, filename, size, image_type) in enumerate(images, 1):
+                record = ImageRecord(
+                    message_id=message.id,
+                    channel_id=channel.id,
+                    channel=channel.name,
+                    author=str(message.author.display_name),
+                    username=message.author.name,
+                    timestamp=message.created_at,
+                    url=url,
+                    filename=filename,
+                    size=size,
+                    type=image_type,
+                    key=key,
+                    index=index,
+                    jump_url=message.jump_url,
+                    content=content,
+                )
+                if self.exporter:
+                    self.exporter.write(record)
+                if self.table:
+                    self.image_records.append(record)
+                if self.download:
+                    await queue.put((record, cursor))
+
+    def snowflake_bounds(self):
+        """Return exclusive (after, before) message IDs for the date filters"""
+        after_id = before_id = None
+        if self.from_dt:
+            # The highest ID from the millisecond before from_dt, so messages
+            # sent exactly at from_dt are included.
+            after_id = discord.utils.time_snowflake(self.from_dt - timedelta(milliseconds=1), high=True)
+        if self.to_dt:
+            before_id = discord.utils.time_snowflake(self.to_dt, high=False)
+        return after_id, before_id
+
+    def print_report(self, channels):
         # Display summary
         console.print()
-        console.print(f"[bold]Scanned {messages_scanned} messages[/bold]")
-        console.print(f"[bold]Found {len(messages_with_images)} messages with {image_count} images[/bold]")
+        console.print(f"[bold]Scanned {self.messages_scanned} messages in {len(channels)} channels[/bold]")
+        console.print(f"[bold]Found {self.messages_with_images} messages with {self.image_count} images[/bold]")
         console.print()
+        if self.exporter:
+            console.print(f"[yellow]📝 Exported {self.image_count} image records[/yellow]")
+            console.print()
+        if self.table:
+            self.print_table(channels)
+
+        # Download summary
+        if self.download:
+            console.print()
+            console.print(f"[green]✓ Downloaded: {self.download_results['downloaded']} new images[/green]")
+            if self.download_results['duplicate'] > 0:
+                console.print(f"[green]✓ Linked: {self.download_results['duplicate']} images already stored under another name[/green]")
+            if self.download_results['skipped'] > 0:
+                console.print(f"[yellow]⏭️  Skipped: {self.download_results['skipped']} existing images[/yellow]")
+            if self.bytes_saved > 0:
+                console.print(f"[green]💾 Saved {self._format_size(self.bytes_saved)} by deduplication[/green]")
+            if self.download_results['failed'] > 0:
+                console.print(f"[red]✗ Failed: {self.download_results['failed']} images[/red]")
 
-        # Create table
-        table = Table(title=f"Images in #{channel.name}")
+    def print_table(self, channels):
+        multiple_channels = len(channels) > 1
+        title = f"Images in {len(channels)} channels" if multiple_channels else f"Images in #{channels[0].name}"
+        table = Table(title=title)
         table.add_column("Time", style="cyan")
+        if multiple_channels:
+            table.add_column("Channel", style="yellow")
         table.add_column("Author", style="magenta")
         table.add_column("Images", style="green")
         if self.verbose:
             table.add_column("Content", style="dim")
         table.add_column("Link", style="blue")
 
-        for msg_data in reversed(messages_with_images):  # Show oldest first
-            message = msg_data['message']
-            images = msg_data['images']
-            
-            timestamp = message.created_at.strftime("%Y-%m-%d %H:%M")
-            author = str(message.author.display_name)
-            
+        # Show oldest first; message IDs sort by time across channels
+        records = sorted(
+            self.image_records, key=lambda record: (record.message_id, record.index)
+        )
+        for _, message_records in groupby(
+            records, key=lambda record: record.message_id
+        ):
+            message_records = list(message_records)
+            first = message_records[0]
+            timestamp = first.timestamp.strftime("%Y-%m-%d %H:%M")
+
             # Format images info
             image_info = []
-            for img in images:
-                if img['type'] == 'attachment':
-                    size_str = f" ({self._format_size(img['size'])})" if img['size'] else ""
-                    image_info.append(f"📎 {img['filename']}{size_str}")
-                elif img['type'] == 'embed':
+            for record in message_records:
+                if record.type == 'attachment':
+                    size_str = f" ({self._format_size(record.size)})" if record.size else ""
+                    image_info.append(f"📎 {record.filename}{size_str}")
+                elif record.type == 'embed':
                     image_info.append(f"🖼️ [embed]")
-                elif img['type'] == 'embed_thumb':
+                elif record.type == 'embed_thumb':
                     image_info.append(f"🖼️ [thumbnail]")
-            
+
             image_str = "\n".join(image_info)
-            
+
             # Add row to table
-            row = [timestamp, author, image_str]
-            
+            row = [timestamp]
+            if multiple_channels:
+                row.append(f"#{first.channel}")
+            row += [first.author, image_str]
+
             if self.verbose:
-                content = message.content[:50] + "..." if len(message.content) > 50 else message.content
-                row.append(content or "[no text]")
-                
-            row.append(f"[link={message.jump_url}]Jump[/link]")
-            
+                row.append(first.content or "[no text]")
+
+            row.append(f"[link={first.jump_url}]Jump[/link]")
+
             table.add_row(*row)
 
         console.print(table)
 
-        # Download images if requested
-        if self.download:
-            console.print()
-            Path(self.download_dir).mkdir(exist_ok=True)
-            
-            download_count = 0
-            skip_count = 0
-            
-            with Progress(console=console) as progress:
-                download_task = progress.add_task(
-                    "[cyan]Downloading images...", 
-                    total=image_count
-                )
-                
-                for msg_data in messages_with_images:
-                    message = msg_data['message']
-                    images = msg_data['images']
-                    
-                    for img_index, img in enumerate(images, 1):
-                        result = await self.download_image(
-                            img['url'], 
-                            img['filename'], 
-                            message.id,
-                            message.author.name,
-                            message.created_at,
-                            img_index
-                        )
-                        if result == 'downloaded':
-                            download_count += 1
-                        elif result == 'skipped':
-                            skip_count += 1
-                        progress.update(download_task, advance=1)
-            
-            # Summary
-            console.print()
-            console.print(f"[green]✓ Downloaded: {download_count} new images[/green]")
-            if skip_count > 0:
-                console.print(f"[yellow]⏭️  Skipped: {skip_count} existing images[/yellow]")
-
     def _format_size(self, size_bytes):
         """Format bytes to human readable size"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -389,160 +741,267 @@ class ImageScannerClient(discord.Client):
             size_bytes /= 1024.0
         return f"{size_bytes:.1f}TB"
 
-    async def download_image(self, url, filename, message_id, author_name, message_timestamp, img_count):
+    async def download_image(self, session, url, filename, message_id, author_name, message_timestamp, img_count, on_chunk=None, key=None, channel_id=None, expected_size=None):
+        """Stream an image to a temporary file, hashing it as it arrives.
+
+        Returns the result and, for a completed download, a FetchedImage for the
+        tagging stage to finish. Chunks go straight to disk, so memory use stays
+        bounded by the chunk size, and the temporary file is removed on failure.
+        """
         # Format filename as "{timestamp}_{id}_{count}_{username}.jpg"
         safe_author = "".join(c for c in author_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
         timestamp_str = message_timestamp.strftime("%Y-%m-%d-%H%M%S")
         count_str = f"{img_count:02d}"
-        
+
         # Get file extension from original filename
         file_ext = Path(filename).suffix.lower() or '.jpg'
-        
+
         safe_filename = f"{timestamp_str}_{message_id}_{count_str}_{safe_author}{file_ext}"
         file_path = Path(self.download_dir) / safe_filename
 
-        # Check if file already exists
+        # Check whether an earlier run already stored this attachment (same ID and
+        # size) or embed URL, without touching the network
+        if self.state and key:
+            download = self.state.get_download(key)
+            if download and download.sha256:
+                stored_path = Path(download.path)
+                if stored_path.exists() and expected_size in (None, download.size):
+                    if not file_path.exists():
+                        # The same embed URL posted in another message
+                        self.store.link(stored_path, file_path)
+                        self.bytes_saved += download.size or 0
+                    return 'skipped', None
+            elif download and Path(download.path).exists():
+                return 'skipped', None
         if file_path.exists():
-            return 'skipped'
+            return 'skipped', None
 
+        temp_path = self.store.root / f".{safe_filename}.part"
+        size = 0
+        jpeg = False
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        
-                        # Add EXIF and IPTC attribution data if it's actually a JPEG file (check content, not filename)
-                        if len(content) > 0 and self.is_jpeg_content(content):
-                            try:
-                                content = self.add_attribution_metadata(content, author_name, message_id, message_timestamp)
-                            except Exception as e:
-                                console.print(f"[yellow]Warning: Could not add metadata to {filename}: {str(e)}[/yellow]")
-                        
-                        with open(file_path, 'wb') as f:
-                            f.write(content)
-                        return 'downloaded'
-                    else:
-                        console.print(
-                            f"[red]Failed to download {filename}: HTTP {response.status}[/red]"
-                        )
-                        return 'failed'
+            async with session.get(url) as response:
+                if response.status != 200:
+                    console.print(
+                        f"[red]Failed to download {filename}: HTTP {response.status}[/red]"
+                    )
+                    return 'failed', None
+
+                digest = hashlib.sha256()
+                with open(temp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        if size == 0:
+                            # Only JPEGs get attribution (checks content, not filename)
+                            jpeg = is_jpeg(chunk)
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+                        if on_chunk:
+                            on_chunk(len(chunk))
         except Exception as e:
             console.print(f"[red]Error downloading {filename}: {str(e)}[/red]")
-            return 'failed'
+            temp_path.unlink(missing_ok=True)
+            return 'failed', None
 
-    def is_jpeg_content(self, content: bytes) -> bool:
-        """Check if content is actually a JPEG file by examining file headers"""
-        if len(content) < 4:
-            return False
-        # JPEG files start with FF D8 and end with FF D9
-        return content.startswith(b'\xff\xd8') and content.endswith(b'\xff\xd9')
+        return 'fetched', FetchedImage(
+            temp_path=temp_path,
+            file_path=file_path,
+            suffix=file_ext,
+            sha256=digest.hexdigest(),
+            size=size,
+            is_jpeg=jpeg,
+            attribution=Attribution(author_name, message_id, message_timestamp),
+            key=key,
+            channel_id=channel_id,
+            message_id=message_id,
+        )
 
-    def add_attribution_metadata(self, image_data: bytes, author_name: str, message_id: int, message_timestamp) -> bytes:
-        """Add both EXIF and IPTC attribution metadata"""
-        try:
-            # First add EXIF data
-            image_data_with_exif = self.add_attribution_exif(image_data, author_name, message_id, message_timestamp)
-            
-            # Then add IPTC data using iptcinfo3
-            from io import BytesIO
-            import tempfile
-            import os
-            
-            # Write to temporary file since iptcinfo3 works better with files
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                temp_file.write(image_data_with_exif)
-                temp_file.flush()
-                temp_path = temp_file.name
-            
-            try:
-                # Suppress debug output from iptcinfo3
-                import sys
-                from io import StringIO
-                
-                # Capture stdout to suppress debug messages
-                old_stdout = sys.stdout
-                sys.stdout = StringIO()
-                
+
+class ImageScannerClient(ImageScanner, discord.Client):
+    """Scan through a gateway session, using discord.py's channel cache"""
+
+    def __init__(self, **options):
+        intents = discord.Intents.default()
+        intents.message_content = True
+        discord.Client.__init__(self, intents=intents)
+        ImageScanner.__init__(self, **options)
+        self.processed = False
+
+    async def on_ready(self):
+        console.print(f"[green]✓[/green] Logged in as {self.user}")
+
+        if not self.processed:
+            await self.scan_channels()
+            self.processed = True
+            await self.close()
+
+    async def resolve_channels(self):
+        """Expand the guild, categories and channels into messageable channels"""
+        targets = []
+        if self.guild_id:
+            guild = self.get_guild(self.guild_id)
+            if not guild:
+                console.print(f"[red]✗ Guild {self.guild_id} not found[/red]")
+                return []
+            targets += guild.channels
+        for channel_id in self.channel_ids:
+            channel = self.get_channel(channel_id)
+            if not channel:
                 try:
-                    # Load IPTC info from temp file
-                    info = IPTCInfo(temp_path, force=True)
-                    
-                    # Add IPTC title for Google Photos compatibility
-                    title_text = f"PyOhio photo by {author_name}"
-                    info['object name'] = title_text
-                    info['caption/abstract'] = f"Photo from PyOhio by Discord user: {author_name}"
-                    info['by-line'] = author_name
-                    info['copyright notice'] = f"Uploaded by {author_name}"
-                    
-                    # Save changes back to the temp file
-                    info.save()
-                finally:
-                    # Restore stdout
-                    sys.stdout = old_stdout
-                
-                # Read the updated file back
-                with open(temp_path, 'rb') as f:
-                    result = f.read()
-                
-                return result
-                
-            finally:
-                # Clean up temp file
-                os.unlink(temp_path)
-            
-        except Exception as e:
-            console.print(f"[yellow]Warning: Could not add IPTC metadata: {str(e)}[/yellow]")
-            # Fall back to just EXIF data
-            return self.add_attribution_exif(image_data, author_name, message_id, message_timestamp)
+                    channel = await self.fetch_channel(channel_id)
+                except discord.HTTPException:
+                    console.print(f"[red]✗ Channel {channel_id} not found[/red]")
+                    continue
+            targets.append(channel)
+
+        channels = {}
+        for target in targets:
+            expanded = [target]
+            if isinstance(target, discord.CategoryChannel):
+                expanded = target.channels
+            for channel in expanded:
+                if isinstance(channel, discord.abc.Messageable):
+                    channels[channel.id] = channel
+                if self.include_threads and isinstance(
+                    channel, (discord.TextChannel, discord.ForumChannel)
+                ):
+                    for thread in channel.threads:
+                        channels[thread.id] = thread
+                    async for thread in self.archived_threads(channel):
+                        channels[thread.id] = thread
+        return list(channels.values())
 
-    def add_attribution_exif(self, image_data: bytes, author_name: str, message_id: int, message_timestamp) -> bytes:
-        """Add attribution information to EXIF data while preserving existing data"""
+    async def archived_threads(self, channel):
+        """Yield public archived threads that may have messages in the date range"""
         try:
-            # Try to load existing EXIF data
+            async for thread in channel.archived_threads(limit=None):
+                # Threads are returned most recently archived first, and a thread
+                # archived before the range has no messages in it.
+                if self.from_dt and thread.archive_timestamp < self.from_dt:
+                    break
+                yield thread
+        except discord.Forbidden:
+            console.print(
+                f"[yellow]Warning: No access to archived threads in "
+                f"#{channel.name}[/yellow]"
+            )
+
+    def channel_history(self, channel, after=None, before=None, **kwargs):
+        return channel.history(
+            after=discord.Object(id=after) if after else None,
+            before=discord.Object(id=before) if before else None,
+            **kwargs
+        )
+
+
+class RestImageScanner(ImageScanner):
+    """Scan over the REST API alone, without a gateway session.
+
+    A one-shot scan has no use for the login, guild cache and member state the
+    gateway brings, which dominate startup on large guilds. Channels, threads
+    and history pages are requested directly with DiscordClient, which paces
+    requests by Discord's rate limit headers.
+    """
+
+    def __init__(self, token, **options):
+        super().__init__(**options)
+        self.api = DiscordClient(
+            api_base_url=settings.DISCORD_API_BASE_URL,
+            bot_token=token,
+            guild_id=self.guild_id,
+            timeout=settings.DISCORD_HTTP_TIMEOUT_SECONDS,
+            max_retries=settings.DISCORD_HTTP_MAX_RETRIES,
+        )
+        self.guild_channels = {}
+        self.active_threads = {}
+
+    async def run(self):
+        try:
+            await self.scan_channels()
+        finally:
+            await self.api.close()
+
+    async def get_guild_channels(self, guild_id):
+        if guild_id not in self.guild_channels:
+            self.guild_channels[guild_id] = [
+                RestChannel(data, guild_id)
+                for data in await self.api.get_guild_channels(guild_id)
+            ]
+        return self.guild_channels[guild_id]
+
+    async def get_active_threads(self, guild_id):
+        if guild_id not in self.active_threads:
+            self.active_threads[guild_id] = [
+                RestChannel(data, guild_id)
+                for data in await self.api.get_active_threads(guild_id)
+            ]
+        return self.active_threads[guild_id]
+
+    async def resolve_channels(self):
+        """Expand the guild, categories and channels into messageable channels"""
+        targets = []
+        if self.guild_id:
             try:
-                exif_dict = piexif.load(image_data)
-            except (piexif.InvalidImageDataError, ValueError):
-                # No existing EXIF data, create new structure
-                exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
-            
-            # Ensure the required sections exist
-            if "0th" not in exif_dict:
-                exif_dict["0th"] = {}
-            if "Exif" not in exif_dict:
-                exif_dict["Exif"] = {}
-            
-            # Add attribution information without overwriting existing fields
-            attribution_text = f"Discord user: {author_name} (Message ID: {message_id})"
-            description_text = f"Photo from PyOhio by Discord user: {author_name}"
-            
-            # Only add attribution fields if they don't already exist (preserve existing values)
-            if piexif.ImageIFD.Artist not in exif_dict["0th"]:
-                exif_dict["0th"][piexif.ImageIFD.Artist] = attribution_text
-            if piexif.ImageIFD.Copyright not in exif_dict["0th"]:
-                exif_dict["0th"][piexif.ImageIFD.Copyright] = f"Uploaded by {author_name}"
-            if piexif.ImageIFD.ImageDescription not in exif_dict["0th"]:
-                exif_dict["0th"][piexif.ImageIFD.ImageDescription] = description_text
-                
-            # Add Discord message timestamp as the DateTime if not already present
-            if piexif.ImageIFD.DateTime not in exif_dict["0th"]:
-                # Convert Discord timestamp to EXIF datetime format (YYYY:MM:DD HH:MM:SS)
-                exif_datetime = message_timestamp.strftime("%Y:%m:%d %H:%M:%S")
-                exif_dict["0th"][piexif.ImageIFD.DateTime] = exif_datetime
-                
-            # Also add to DateTimeOriginal if not present
-            if piexif.ExifIFD.DateTimeOriginal not in exif_dict["Exif"]:
-                exif_datetime = message_timestamp.strftime("%Y:%m:%d %H:%M:%S")
-                exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = exif_datetime
-            
-            # Convert back to bytes and insert into image
-            exif_bytes = piexif.dump(exif_dict)
-            
-            # Use BytesIO to handle the insertion properly
-            from io import BytesIO
-            output = BytesIO()
-            piexif.insert(exif_bytes, image_data, output)
-            return output.getvalue()
-            
-        except Exception as e:
-            console.print(f"[yellow]Warning: Could not add EXIF attribution: {str(e)}[/yellow]")
-            return image_data
\ No newline at end of file
+                targets += await self.get_guild_channels(self.guild_id)
+            except DiscordAPIError:
+                console.print(f"[red]✗ Guild {self.guild_id} not found[/red]")
+                return []
+        for channel_id in self.channel_ids:
+            try:
+                targets.append(RestChannel(await self.api.get_channel(channel_id)))
+            except DiscordAPIError:
+                console.print(f"[red]✗ Channel {channel_id} not found[/red]")
+
+        channels = {}
+        for target in targets:
+            expanded = [target]
+            if target.type == GUILD_CATEGORY:
+                expanded = [
+                    channel
+                    for channel in await self.get_guild_channels(target.guild_id)
+                    if channel.parent_id == target.id
+                ]
+            for channel in expanded:
+                if channel.is_messageable:
+                    channels[channel.id] = channel
+                if self.include_threads and channel.has_threads:
+                    for thread in await self.get_active_threads(channel.guild_id):
+                        if thread.parent_id == channel.id:
+                            channels[thread.id] = thread
+                    async for thread in self.archived_threads(channel):
+                        channels[thread.id] = thread
+        return list(channels.values())
+
+    async def archived_threads(self, channel):
+        """Yield public archived threads that may have messages in the date range"""
+        try:
+            async for thread in archived_threads(self.api, channel):
+                if self.from_dt and thread.archive_timestamp < self.from_dt:
+                    break
+                yield thread
+        except DiscordAPIError as e:
+            if e.status != 403:
+                raise
+            console.print(
+                f"[yellow]Warning: No access to archived threads in "
+                f"#{channel.name}[/yellow]"
+            )
+
+    def channel_history(self, channel, **kwargs):
+        return channel_messages(self.api, channel, **kwargs)
+
+
+class FetchedImage:
+    """A completed download waiting to be tagged and moved into the store."""
+
+    def __init__(self, temp_path, file_path, suffix, sha256, size, is_jpeg, attribution, key, channel_id, message_id):
+        self.temp_path = temp_path
+        self.file_path = file_path
+        self.suffix = suffix
+        self.sha256 = sha256
+        self.size = size
+        self.is_jpeg = is_jpeg
+        self.attribution = attribution
+        self.key = key
+        self.channel_id = channel_id
+        self.message_id = message_id
@@ -1,97 +1,354 @@
 import asyncio
 import logging
 import os
+import socket
+import threading
 from datetime import timedelta
 
 import discord
-import pytz
 from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import BaseCommand
 from django.utils import timezone
-from nextupbot.models import SessionNotification
+from nextupbot.embeds import encode_embed, encode_message
+from nextupbot.models import NotificationDelivery, SessionNotification
+from nextupbot.notify import listen, supports_listen
+from nextupbot.schedule import NotificationSchedule
+from registrations.discord_api import get_client
 
 logger = logging.getLogger(__name__)
 
 DISCORD_BOT_TOKEN = settings.DISCORD_BOT_TOKEN
 DISCORD_BOT_CHANNEL = settings.DISCORD_BOT_CHANNEL
+DISCORD_BOT_CLAIM_LEASE_SECONDS = settings.DISCORD_BOT_CLAIM_LEASE_SECONDS
 DISCORD_BOT_OFFSET_SECONDS = settings.DISCORD_BOT_OFFSET_SECONDS
+DISCORD_BOT_REFRESH_SECONDS = settings.DISCORD_BOT_REFRESH_SECONDS
+DISCORD_BOT_RETRY_SECONDS = settings.DISCORD_BOT_RETRY_SECONDS
+DISCORD_BOT_SEND_CONCURRENCY = settings.DISCORD_BOT_SEND_CONCURRENCY
 DISCORD_BOT_WINDOW_SECONDS = settings.DISCORD_BOT_WINDOW_SECONDS
 
 
+def gateway_options():
+    """Intents and caches for the notification bot.
+
+    Notifications are read from the database and posted over REST, so the
+    gateway session only keeps the bot online: it subscribes to no events and
+    caches no messages or members. With no guild events coming, there is no
+    point waiting for them before on_ready.
+    """
+    return {
+        "intents": discord.Intents.none(),
+        "max_messages": None,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "guild_ready_timeout": 0,
+    }
+
+
 class BotClient(discord.Client):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        self.schedule = NotificationSchedule()
+        self.schedule_changed = asyncio.Event()
+        self.changed_ids = set()
+        self.reload_needed = False
+        self.watermark = None
+        self.stop_listening = threading.Event()
+        self.send_semaphore = asyncio.Semaphore(DISCORD_BOT_SEND_CONCURRENCY)
+        self.replica_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def setup_hook(self):
         # create the background task and run it in the background
         self.bg_task = self.loop.create_task(self.my_background_task())
-        self.embed = None
-        self.notification = None
-
-    async def build_embed(self):
-        if self.notification is None:
-            return
-        sn = self.notification
-        embed_kwargs = {}
-        if sn.color_hex_string:
-            embed_kwargs["color"] = int(sn.color_hex_string, 16)
-        if sn.url:
-            embed_kwargs["url"] = sn.url
-        if sn.description:
-            embed_kwargs["description"] = sn.description
-        embed = discord.Embed(title=sn.title, **embed_kwargs)
-        if sn.author_name:
-            embed.set_author(name=sn.author_name)
-        if sn.field_1_name:
-            embed.add_field(name=sn.field_1_name, value=sn.field_1_value, inline=False)
-        if sn.field_2_name:
-            embed.add_field(name=sn.field_2_name, value=sn.field_2_value, inline=False)
-        if sn.field_3_name:
-            embed.add_field(name=sn.field_3_name, value=sn.field_3_value, inline=False)
-        self.embed = embed
 
-    @sync_to_async
-    def get_current_notification(self):
+    def send_window(self):
         window = timedelta(seconds=DISCORD_BOT_WINDOW_SECONDS)
         offset = timedelta(seconds=DISCORD_BOT_OFFSET_SECONDS)
         now = timezone.now()
         earliest = now + offset
         latest = now + window + offset
-        logger.error(f"now:{now} earliest:{earliest} latest:{latest}")
-        sessions = SessionNotification.objects.filter(
-            send_by__gte=earliest, send_by__lte=latest, sent=False
-        ).order_by("send_by")
-        if sessions:
-            self.notification = sessions[0]
-        else:
-            self.notification = None
+        return now, earliest, latest
+
+    @sync_to_async
+    def load_schedule(self):
+        """Load every upcoming unsent notification into the in-memory schedule."""
+        _, earliest, _ = self.send_window()
+        self.watermark = timezone.now()
+        sessions = SessionNotification.objects.filter(send_by__gte=earliest, sent=False)
+        self.schedule.clear()
+        for session in sessions:
+            if not session.embed_json:
+                logger.error(
+                    f"notification id={session.id} has an invalid embed and "
+                    f"will not be sent until it is fixed in the admin"
+                )
+            self.schedule.upsert(session)
+        logger.info(f"loaded {len(self.schedule)} upcoming notifications")
+
+    @sync_to_async
+    def refresh_schedule(self, notification_ids):
+        """Reload only the notifications that changed since the schedule was built."""
+        sessions = {
+            session.id: session
+            for session in SessionNotification.objects.filter(id__in=notification_ids)
+        }
+        for notification_id in notification_ids:
+            if notification_id in sessions:
+                self.schedule.upsert(sessions[notification_id])
+            else:
+                self.schedule.remove(notification_id)
+
+    @sync_to_async
+    def get_changed_ids(self):
+        watermark = self.watermark
+        self.watermark = timezone.now()
+        return set(
+            SessionNotification.objects.filter(updated_at__gte=watermark).values_list(
+                "id", flat=True
+            )
+        )
+
+    def mark_changed(self, notification_id):
+        self.changed_ids.add(notification_id)
+        self.schedule_changed.set()
+
+    def mark_reload_needed(self):
+        self.reload_needed = True
+        self.schedule_changed.set()
+
+    async def watch_for_changes(self):
+        """Keep the schedule current without polling when Postgres can notify us."""
+        if supports_listen():
+            loop = asyncio.get_running_loop()
+            thread = threading.Thread(
+                target=listen,
+                args=(
+                    lambda notification_id: loop.call_soon_threadsafe(
+                        self.mark_changed, notification_id
+                    ),
+                    lambda: loop.call_soon_threadsafe(self.mark_reload_needed),
+                    self.stop_listening,
+                ),
+                daemon=True,
+            )
+            thread.start()
+            return
+        while not self.is_closed():
+            await asyncio.sleep(DISCORD_BOT_REFRESH_SECONDS)
+            changed_ids = await self.get_changed_ids()
+            if changed_ids:
+                self.changed_ids.update(changed_ids)
+                self.schedule_changed.set()
+
+    async def apply_schedule_changes(self):
+        if self.reload_needed:
+            self.reload_needed = False
+            self.changed_ids.clear()
+            await self.load_schedule()
+        elif self.changed_ids:
+            changed_ids, self.changed_ids = self.changed_ids, set()
+            await self.refresh_schedule(changed_ids)
+
+    @sync_to_async
+    def claim_notifications(self, notification_ids):
+        """Claim due notifications so that only one replica sends each of them."""
+        return SessionNotification.objects.claim(
+            notification_ids, self.replica_id, DISCORD_BOT_CLAIM_LEASE_SECONDS
+        )
+
+    async def renew_claim(self, token):
+        """Extend the lease while sends are in flight so it does not expire."""
+        while True:
+            await asyncio.sleep(DISCORD_BOT_CLAIM_LEASE_SECONDS / 3)
+            await sync_to_async(SessionNotification.objects.renew_claim)(
+                token, DISCORD_BOT_CLAIM_LEASE_SECONDS
+            )
+
+    def recheck_after_lease(self, notification_ids):
+        """Re-read notifications claimed elsewhere once that claim could expire.
+
+        If the other replica died before sending, the notification is still
+        unsent and goes back into the schedule while its window is open.
+        """
+        loop = asyncio.get_running_loop()
+        for notification_id in notification_ids:
+            loop.call_later(
+                DISCORD_BOT_CLAIM_LEASE_SECONDS, self.mark_changed, notification_id
+            )
+
+    def retry_failed(self, notification_ids):
+        """Re-read notifications whose send failed after their claim is released.
+
+        Releasing a claim is a bulk update that fires no signal or NOTIFY, so
+        nothing else would put them back in the schedule. They are retried until
+        their send window closes.
+        """
+        loop = asyncio.get_running_loop()
+        for notification_id in notification_ids:
+            loop.call_later(
+                DISCORD_BOT_RETRY_SECONDS, self.mark_changed, notification_id
+            )
+
+    def seconds_until_next(self):
+        notification = self.schedule.peek()
+        if notification is None:
+            return None
+        _, _, latest = self.send_window()
+        return max(0, (notification.send_by - latest).total_seconds())
+
+    @sync_to_async
+    def set_notifications_sent(self, token, sent, failed):
+        SessionNotification.objects.mark_sent(
+            token, [notification.id for notification in sent], timezone.now()
+        )
+        if failed:
+            SessionNotification.objects.release_claim(
+                token, [notification.id for notification in failed]
+            )
+
+    def due_at(self, notification):
+        window = timedelta(seconds=DISCORD_BOT_WINDOW_SECONDS)
+        offset = timedelta(seconds=DISCORD_BOT_OFFSET_SECONDS)
+        return notification.send_by - window - offset
+
+    def pending_channels(self, notification):
+        """Return (DiscordChannel, channel ID) pairs the notification has not reached.
+
+        Notifications without channels go to the default bot channel, which has
+        no DiscordChannel.
+        """
+        channels = notification.channels.all()
+        if not channels:
+            return [(None, DISCORD_BOT_CHANNEL)]
+        delivered_ids = {
+            delivery.channel_id for delivery in notification.deliveries.all()
+        }
+        return [
+            (channel, int(channel.discord_channel_id))
+            for channel in channels
+            if channel.id not in delivered_ids
+        ]
 
     @sync_to_async
-    def set_notification_sent(self):
-        if self.notification is not None:
-            self.notification.sent = True
-            self.notification.save()
-            self.notification = None
+    def record_deliveries(self, notification, channels, sent_at):
+        NotificationDelivery.objects.bulk_create(
+            [
+                NotificationDelivery(
+                    notification=notification, channel=channel, sent_at=sent_at
+                )
+                for channel in channels
+            ],
+            ignore_conflicts=True,
+        )
+
+    async def send_to_channel(self, channel_id, body):
+        async with self.send_semaphore:
+            await get_client().create_message(channel_id, body)
+
+    async def send_notification(self, notification):
+        """Post a notification to each channel that does not have it yet.
+
+        The embed is encoded when the notification is saved, so each channel
+        gets the same pre-encoded body in a single REST request. Each channel
+        that accepts the post is recorded. If any channel fails, the send fails,
+        and the retry only posts to the channels that are still missing it.
+        """
+        embed_json = notification.embed_json or encode_embed(notification)
+        if not embed_json:
+            raise ValueError(f"notification {notification.id} has an invalid embed")
+        body = encode_message(embed_json)
+        targets = self.pending_channels(notification)
+        results = await asyncio.gather(
+            *(self.send_to_channel(channel_id, body) for _, channel_id in targets),
+            return_exceptions=True,
+        )
+        sent_at = timezone.now()
+        delivered = []
+        errors = []
+        for (channel, channel_id), result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"failed to send notification {notification.id} "
+                    f"to channel {channel_id}: {result!r}"
+                )
+                errors.append(result)
+            elif channel is not None:
+                delivered.append(channel)
+        if delivered:
+            await self.record_deliveries(notification, delivered, sent_at)
+        if errors:
+            raise errors[0]
+        return sent_at
+
+    async def send_due_notifications(self, due):
+        """Send every due notification concurrently and mark them sent in one update."""
+        token, notifications = await self.claim_notifications([sn.id for sn in due])
+        claimed_ids = {notification.id for notification in notifications}
+        self.recheck_after_lease([sn.id for sn in due if sn.id not in claimed_ids])
+        if not notifications:
+            return
+
+        renew_task = asyncio.create_task(self.renew_claim(token))
+        try:
+            results = await asyncio.gather(
+                *(self.send_notification(sn) for sn in notifications),
+                return_exceptions=True,
+            )
+        finally:
+            renew_task.cancel()
+        sent = []
+        failed = []
+        for notification, result in zip(notifications, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"failed to send notification {notification.id}: {result!r}"
+                )
+                failed.append(notification)
+                continue
+            sent.append(notification)
+            lateness = (result - self.due_at(notification)).total_seconds() * 1000
+            logger.info(
+                f"sent notification id={notification.id} "
+                f"lateness_ms={lateness:.0f} title={notification.title!r}"
+            )
+        await self.set_notifications_sent(token, sent, failed)
+        self.retry_failed([notification.id for notification in failed])
 
     async def on_ready(self):
         print("Logged on as {0}!".format(self.user))
 
+    async def close(self):
+        self.stop_listening.set()
+        await get_client().close()
+        await super().close()
+
     async def my_background_task(self):
         await self.wait_until_ready()
-        # counter = 0
-        channel = self.get_channel(DISCORD_BOT_CHANNEL)
+        await self.load_schedule()
+        self.watch_task = asyncio.create_task(self.watch_for_changes())
         while not self.is_closed():
-            # counter += 1
-            # await channel.send(timezone.now())
-            await self.get_current_notification()
-            if self.notification:
-                await self.build_embed()
-                await channel.send(embed=self.embed)
-                await self.set_notification_sent()
-            else:
-                logger.info("no notifications to send")
-                # await channel.send("Nothin'")
-            await asyncio.sleep(5)
+            await self.apply_schedule_changes()
+            now, earliest, latest = self.send_window()
+            due = []
+            for notification in self.schedule.pop_due(latest):
+                if notification.send_by < earliest:
+                    logger.warning(
+                        f"skipping stale notification id={notification.id} "
+                        f"send_by={notification.send_by}"
+                    )
+                    continue
+                due.append(notification)
+            if due:
+                await self.send_due_notifications(due)
+
+            try:
+                await asyncio.wait_for(
+                    self.schedule_changed.wait(), timeout=self.seconds_until_next()
+                )
+            except asyncio.TimeoutError:
+                pass
+            self.schedule_changed.clear()
 
 
 class Command(BaseCommand):
@@ -102,7 +359,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         logger.info("creating bot client")
-        bot = BotClient()
+        bot = BotClient(**gateway_options())
         bot.run(DISCORD_BOT_TOKEN)
         logger.info("bot client ended")
 
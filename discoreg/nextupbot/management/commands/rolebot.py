@@ -1,9 +1,12 @@
 import asyncio
 import logging
-import discord
+import os
+
 import arrow
+import discord
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from nextupbot.grantlog import GrantLog
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +15,32 @@ DISCORD_BOT_DEBUG_CHANNEL = settings.DISCORD_BOT_DEBUG_CHANNEL
 DISCORD_BOT_EVENT_ROLE = settings.DISCORD_BOT_EVENT_ROLE
 DISCORD_BOT_EVENT_START_DATETIME = arrow.get(settings.DISCORD_BOT_EVENT_START_DATETIME)
 DISCORD_BOT_EVENT_END_DATETIME = arrow.get(settings.DISCORD_BOT_EVENT_END_DATETIME)
+DISCORD_BOT_AUDIT_LOG = settings.DISCORD_BOT_AUDIT_LOG
+DISCORD_BOT_DEBUG_FLUSH_SECONDS = settings.DISCORD_BOT_DEBUG_FLUSH_SECONDS
+DISCORD_BOT_DEBUG_FLUSH_EVENTS = settings.DISCORD_BOT_DEBUG_FLUSH_EVENTS
+DISCORD_BOT_MEMBERS_INTENT = settings.DISCORD_BOT_MEMBERS_INTENT
+
+
+def gateway_options():
+    """Intents and caches for the event role bot.
+
+    Only guild messages and reactions are needed to see who is taking part,
+    and their payloads carry the member and their roles, so members and
+    messages are not cached. The privileged members intent is requested only
+    when DISCORD_BOT_MEMBERS_INTENT is set, to seed the members who already
+    have the event role with one fetch at startup.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.guild_reactions = True
+    intents.members = DISCORD_BOT_MEMBERS_INTENT
+    return {
+        "intents": intents,
+        "max_messages": None,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+    }
 
 
 class BotClient(discord.Client):
@@ -22,9 +51,63 @@ class BotClient(discord.Client):
         # self.bg_task = self.loop.create_task(self.test_loop())
         self.embed = None
         self.notification = None
+        self.event_role = None
+        # IDs of members known to have the event role, and of members whose
+        # role is being added right now, so each member costs at most one
+        # add_roles call however many messages and reactions they send.
+        self.role_member_ids = set()
+        self.role_pending_ids = set()
+        self.grant_log = None
+
+    async def setup_hook(self):
+        self.grant_log = GrantLog(
+            self.send_debug,
+            DISCORD_BOT_AUDIT_LOG,
+            flush_seconds=DISCORD_BOT_DEBUG_FLUSH_SECONDS,
+            flush_events=DISCORD_BOT_DEBUG_FLUSH_EVENTS,
+        )
+        self.grant_log.start()
+
+    async def close(self):
+        if self.grant_log and not self.grant_log.closing:
+            # Post what is still buffered while the connection is open
+            await self.grant_log.close()
+        await super().close()
+
+    async def send_debug(self, text):
+        debug_channel = self.get_channel(DISCORD_BOT_DEBUG_CHANNEL)
+        if debug_channel is None:
+            logger.warning(f"Debug channel {DISCORD_BOT_DEBUG_CHANNEL} not found")
+            return
+        await debug_channel.send(text)
 
     async def on_ready(self):
         print("Logged on as {0}!".format(self.user))
+        # on_ready fires again after a reconnect; the set is only seeded once
+        if self.event_role is None:
+            await self.load_role_members()
+
+    async def load_role_members(self):
+        for guild in self.guilds:
+            role = guild.get_role(DISCORD_BOT_EVENT_ROLE)
+            if role is not None:
+                break
+        else:
+            logger.error(f"Event role {DISCORD_BOT_EVENT_ROLE} not found")
+            return
+        self.event_role = role
+        if guild.chunked:
+            self.role_member_ids.update(member.id for member in role.members)
+        else:
+            try:
+                async for member in guild.fetch_members(limit=None):
+                    if member.get_role(role.id):
+                        self.role_member_ids.add(member.id)
+            except (discord.ClientException, discord.HTTPException) as e:
+                # Without the members intent, members are checked the first
+                # time they are seen instead.
+                logger.warning(f"Could not load members with the event role: {e}")
+        logger.info(f"{len(self.role_member_ids)} members have the event role")
 
     async def on_message(self, message):
         debug_channel = self.get_channel(DISCORD_BOT_DEBUG_CHANNEL)
@@ -54,6 +137,9 @@ class BotClient(discord.Client):
             print("After event end, ignoring")
             return
 
+        if payload.member is None:
+            # Reactions in DMs have no member to give a role to
+            return
         print("Raw reaction from {0}: {1}".format(payload, payload))
         # await debug_channel.send(
         #     "Saw raw reaction from {0} on {1}: {2}".format(
@@ -63,13 +149,19 @@ class BotClient(discord.Client):
         await self.assign_role(payload.member)
 
     async def assign_role(self, member):
-        debug_channel = self.get_channel(DISCORD_BOT_DEBUG_CHANNEL)
-        role = member.guild.get_role(DISCORD_BOT_EVENT_ROLE)
-        if role not in member.roles:
-            await member.add_roles(role)
-            await debug_channel.send(
-                "Added role <@&{0.id}> to <@{1.id}>".format(role, member)
-            )
+        if member.id in self.role_member_ids or member.id in self.role_pending_ids:
+            return
+        role = self.event_role
+        if role is None or getattr(member, "guild", None) != role.guild:
+            return
+        self.role_pending_ids.add(member.id)
+        try:
+            if not member.get_role(role.id):
+                await member.add_roles(role)
+                self.grant_log.record(role, member)
+            self.role_member_ids.add(member.id)
+        finally:
+            self.role_pending_ids.discard(member.id)
 
     async def test_loop(self):
         await self.wait_until_ready()
@@ -88,8 +180,13 @@ class Command(BaseCommand):
     #     parser.add_argument('poll_ids', nargs='+', type=int)
 
     def handle(self, *args, **options):
+        if DISCORD_BOT_AUDIT_LOG and not os.path.isabs(DISCORD_BOT_AUDIT_LOG):
+            raise CommandError(
+                f"DISCORD_BOT_AUDIT_LOG must be an absolute path, "
+                f"got {DISCORD_BOT_AUDIT_LOG!r}"
+            )
         logger.info("creating bot client")
-        bot = BotClient()
+        bot = BotClient(**gateway_options())
         bot.run(DISCORD_BOT_TOKEN)
         logger.info("bot client ended")
 
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextupbot", "0004_alter_sessionnotification_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessionnotification",
+            name="sent_at",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registrations", "0012_registration_unique_reference_id"),
+        ("nextupbot", "0005_sessionnotification_sent_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscordChannel",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(blank=True, max_length=100)),
+                ("discord_channel_id", models.CharField(max_length=32)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "discord_server",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="registrations.discordserver",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="sessionnotification",
+            name="channels",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text=(
+                    "Channels to post to. Leave empty to use the default bot channel."
+                ),
+                to="nextupbot.discordchannel",
+            ),
+        ),
+    ]
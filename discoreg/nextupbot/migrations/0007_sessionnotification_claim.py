@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextupbot", "0006_discordchannel"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessionnotification",
+            name="claim_expires_at",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="sessionnotification",
+            name="claimed_by",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:47
+
+import json
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of nextupbot.embeds.encode_embed, so later changes to the
+# encoder do not change what this migration writes.
+COLOR_PATTERN = re.compile(r"[0-9a-fA-F]{6}")
+TEXT_LIMITS = {"title": 256, "description": 4096, "author_name": 256}
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+TOTAL_LIMIT = 6000
+
+
+def encode_embed(sn):
+    """Return the embed as compact JSON, or an empty string if it is invalid."""
+    for field, limit in TEXT_LIMITS.items():
+        if len(getattr(sn, field) or "") > limit:
+            return ""
+    payload = {"title": sn.title}
+    if sn.color_hex_string:
+        if not COLOR_PATTERN.fullmatch(sn.color_hex_string):
+            return ""
+        payload["color"] = int(sn.color_hex_string, 16)
+    if sn.url:
+        payload["url"] = sn.url
+    if sn.description:
+        payload["description"] = sn.description
+    if sn.author_name:
+        payload["author"] = {"name": sn.author_name}
+
+    fields = []
+    for number in (1, 2, 3):
+        name = getattr(sn, f"field_{number}_name")
+        value = getattr(sn, f"field_{number}_value")
+        if bool(name) != bool(value):
+            return ""
+        if name:
+            if len(name) > FIELD_NAME_LIMIT or len(value) > FIELD_VALUE_LIMIT:
+                return ""
+            fields.append({"name": name, "value": value, "inline": False})
+    if fields:
+        payload["fields"] = fields
+
+    total = sum(
+        len(text or "")
+        for text in [sn.title, sn.description, sn.author_name]
+        + [field["name"] + field["value"] for field in fields]
+    )
+    if total > TOTAL_LIMIT:
+        return ""
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def encode_existing_embeds(apps, schema_editor):
+    SessionNotification = apps.get_model("nextupbot", "SessionNotification")
+    notifications = list(SessionNotification.objects.all())
+    for notification in notifications:
+        notification.embed_json = encode_embed(notification)
+    SessionNotification.objects.bulk_update(
+        notifications, ["embed_json"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextupbot", "0007_sessionnotification_claim"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessionnotification",
+            name="embed_json",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(encode_existing_embeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextupbot", "0008_sessionnotification_embed_json"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationDelivery",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sent_at", models.DateTimeField()),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="nextupbot.discordchannel",
+                    ),
+                ),
+                (
+                    "notification",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="nextupbot.sessionnotification",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["sent_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="notificationdelivery",
+            constraint=models.UniqueConstraint(
+                fields=("notification", "channel"), name="unique_notification_channel"
+            ),
+        ),
+    ]
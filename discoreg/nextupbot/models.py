@@ -1,4 +1,63 @@
+import uuid
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from .embeds import build_embed_payload, encode_embed
+
+
+class DiscordChannel(models.Model):
+    name = models.CharField(max_length=100, blank=True)
+    discord_channel_id = models.CharField(max_length=32)
+    discord_server = models.ForeignKey(
+        "registrations.DiscordServer", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"#{self.name} <{self.discord_channel_id}>"
+
+
+class SessionNotificationQuerySet(models.QuerySet):
+    def claimable(self, now):
+        return self.filter(sent=False).filter(
+            Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lt=now)
+        )
+
+    def claim(self, notification_ids, owner, lease_seconds):
+        """Lease unsent notifications to one replica, returning the ones it won.
+
+        The conditional UPDATE only matches rows that are unsent and not under an
+        unexpired lease, so when several replicas race for the same rows each row
+        is claimed by exactly one of them. Each call gets its own claim token so
+        the winners can be read back.
+        """
+        now = timezone.now()
+        token = f"{owner}:{uuid.uuid4().hex[:12]}"
+        self.filter(id__in=notification_ids).claimable(now).update(
+            claimed_by=token, claim_expires_at=now + timedelta(seconds=lease_seconds)
+        )
+        return token, list(
+            self.filter(claimed_by=token).prefetch_related("channels", "deliveries")
+        )
+
+    def renew_claim(self, token, lease_seconds):
+        return self.filter(claimed_by=token, sent=False).update(
+            claim_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+        )
+
+    def release_claim(self, token, notification_ids):
+        return self.filter(
+            claimed_by=token, sent=False, id__in=notification_ids
+        ).update(claimed_by="", claim_expires_at=None)
+
+    def mark_sent(self, token, notification_ids, sent_at):
+        return self.filter(claimed_by=token, id__in=notification_ids).update(
+            sent=True, sent_at=sent_at, updated_at=sent_at
+        )
 
 
 class SessionNotification(models.Model):
@@ -23,13 +82,61 @@ class SessionNotification(models.Model):
     )
     author_email = models.EmailField(blank=True, default="")
     send_by = models.DateTimeField()
+    channels = models.ManyToManyField(
+        DiscordChannel,
+        blank=True,
+        help_text="Channels to post to. Leave empty to use the default bot channel.",
+    )
     sent = models.BooleanField(default=False)
+    sent_at = models.DateTimeField(null=True, blank=True, default=None)
+    claimed_by = models.CharField(max_length=128, blank=True, default="")
+    claim_expires_at = models.DateTimeField(null=True, blank=True, default=None)
+    embed_json = models.TextField(blank=True, default="", editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SessionNotificationQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title}"
 
+    def clean(self):
+        build_embed_payload(self)
+
+    def save(self, *args, **kwargs):
+        self.embed_json = encode_embed(self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "embed_json"}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["send_by", "title"]
+
+
+class NotificationDelivery(models.Model):
+    """Records that a notification was posted to one of its channels.
+
+    A notification is only marked sent once every channel has it, so a retry
+    after some channels failed posts to the remaining channels alone.
+    """
+
+    notification = models.ForeignKey(
+        SessionNotification, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    channel = models.ForeignKey(
+        DiscordChannel, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    sent_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.notification} in {self.channel}"
+
+    class Meta:
+        ordering = ["sent_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "channel"], name="unique_notification_channel"
+            )
+        ]
@@ -0,0 +1,51 @@
+import logging
+import select
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "nextupbot_notifications"
+
+
+def supports_listen():
+    return connection.vendor == "postgresql"
+
+
+def notify_changed(notification_id):
+    """Tell listening bots that a SessionNotification was saved or deleted."""
+    if not supports_listen():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, str(notification_id)]
+        )
+
+
+def listen(on_change, on_reconnect, stop_event, timeout=60, retry_seconds=5):
+    """Block on Postgres LISTEN, calling ``on_change`` with each changed row ID.
+
+    Runs in its own thread on a dedicated connection. ``on_reconnect`` is called
+    after the connection is (re)established, since notifications sent while
+    disconnected are lost.
+    """
+    while not stop_event.is_set():
+        try:
+            pg_connection = connection.get_new_connection(
+                connection.get_connection_params()
+            )
+            pg_connection.autocommit = True
+            with pg_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            on_reconnect()
+            while not stop_event.is_set():
+                if select.select([pg_connection], [], [], timeout) == ([], [], []):
+                    continue
+                pg_connection.poll()
+                while pg_connection.notifies:
+                    notify = pg_connection.notifies.pop(0)
+                    on_change(int(notify.payload))
+        except Exception:
+            logger.exception("notification listener failed, reconnecting")
+            time.sleep(retry_seconds)
@@ -0,0 +1,147 @@
+from collections import namedtuple
+from datetime import datetime
+
+import discord
+
+GUILD_TEXT = 0
+GUILD_VOICE = 2
+GUILD_CATEGORY = 4
+GUILD_ANNOUNCEMENT = 5
+ANNOUNCEMENT_THREAD = 10
+PUBLIC_THREAD = 11
+PRIVATE_THREAD = 12
+GUILD_STAGE_VOICE = 13
+GUILD_FORUM = 15
+GUILD_MEDIA = 16
+
+MESSAGEABLE_TYPES = {
+    GUILD_TEXT,
+    GUILD_VOICE,
+    GUILD_ANNOUNCEMENT,
+    ANNOUNCEMENT_THREAD,
+    PUBLIC_THREAD,
+    PRIVATE_THREAD,
+    GUILD_STAGE_VOICE,
+}
+THREAD_PARENT_TYPES = {GUILD_TEXT, GUILD_ANNOUNCEMENT, GUILD_FORUM, GUILD_MEDIA}
+
+PAGE_SIZE = 100
+
+Attachment = namedtuple("Attachment", ["id", "url", "filename", "size"])
+EmbedMedia = namedtuple("EmbedMedia", ["url"])
+Embed = namedtuple("Embed", ["image", "thumbnail"])
+Author = namedtuple("Author", ["name", "display_name"])
+
+
+class RestChannel:
+    """A channel or thread as returned by the REST API."""
+
+    __slots__ = ("id", "name", "type", "guild_id", "parent_id", "archive_timestamp")
+
+    def __init__(self, data, guild_id=None):
+        self.id = int(data["id"])
+        self.name = data.get("name", str(self.id))
+        self.type = data["type"]
+        self.guild_id = data.get("guild_id", guild_id)
+        self.parent_id = int(data["parent_id"]) if data.get("parent_id") else None
+        archive_timestamp = data.get("thread_metadata", {}).get("archive_timestamp")
+        self.archive_timestamp = (
+            datetime.fromisoformat(archive_timestamp) if archive_timestamp else None
+        )
+
+    @property
+    def is_messageable(self):
+        return self.type in MESSAGEABLE_TYPES
+
+    @property
+    def has_threads(self):
+        return self.type in THREAD_PARENT_TYPES
+
+
+class RestMessage:
+    """The parts of a REST message payload that imagescan reads.
+
+    Mirrors the attribute names of ``discord.Message`` so the scan can treat
+    both the same way, without building discord.py's state for each message.
+    """
+
+    __slots__ = (
+        "id",
+        "content",
+        "author",
+        "attachments",
+        "embeds",
+        "created_at",
+        "jump_url",
+    )
+
+    def __init__(self, data, channel):
+        self.id = int(data["id"])
+        self.content = data.get("content", "")
+        author = data["author"]
+        self.author = Author(
+            author["username"], author.get("global_name") or author["username"]
+        )
+        self.attachments = [
+            Attachment(int(a["id"]), a["url"], a["filename"], a.get("size"))
+            for a in data.get("attachments", [])
+        ]
+        self.embeds = [
+            Embed(
+                EmbedMedia(e["image"]["url"]) if e.get("image") else None,
+                EmbedMedia(e["thumbnail"]["url"]) if e.get("thumbnail") else None,
+            )
+            for e in data.get("embeds", [])
+        ]
+        self.created_at = discord.utils.snowflake_time(self.id)
+        self.jump_url = (
+            f"https://discord.com/channels/{channel.guild_id or '@me'}"
+            f"/{channel.id}/{self.id}"
+        )
+
+
+async def channel_messages(
+    api, channel, limit=None, after=None, before=None, oldest_first=False
+):
+    """Page through a channel's messages, like ``discord.abc.Messageable.history``.
+
+    ``after`` and ``before`` are exclusive message IDs. Oldest first pages
+    forwards from ``after``; otherwise pages go backwards from ``before``.
+    """
+    while limit is None or limit > 0:
+        page_size = min(PAGE_SIZE, limit) if limit else PAGE_SIZE
+        if oldest_first:
+            page = await api.get_channel_messages(
+                channel.id, page_size, after=after or 0
+            )
+            page.reverse()
+        else:
+            page = await api.get_channel_messages(channel.id, page_size, before=before)
+        for data in page:
+            message_id = int(data["id"])
+            if (oldest_first and before and message_id >= before) or (
+                not oldest_first and after and message_id <= after
+            ):
+                return
+            yield RestMessage(data, channel)
+        if len(page) < page_size:
+            return
+        if limit:
+            limit -= len(page)
+        if oldest_first:
+            after = int(page[-1]["id"])
+        else:
+            before = int(page[-1]["id"])
+
+
+async def archived_threads(api, channel):
+    """Yield a channel's public archived threads, most recently archived first."""
+    before = None
+    while True:
+        body = await api.get_archived_threads(channel.id, before=before)
+        for data in body["threads"]:
+            thread = RestChannel(data, channel.guild_id)
+            before = data["thread_metadata"]["archive_timestamp"]
+            yield thread
+        if not body.get("has_more") or not body["threads"]:
+            return
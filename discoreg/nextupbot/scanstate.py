@@ -0,0 +1,159 @@
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_cursor (
+    channel_id INTEGER PRIMARY KEY,
+    scanned_from INTEGER,
+    last_message_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS download (
+    key TEXT PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    size INTEGER
+);
+"""
+
+Download = namedtuple("Download", ["path", "sha256", "size"])
+Cursor = namedtuple("Cursor", ["scanned_from", "last_message_id"])
+
+# Columns added since the first state files were written
+ADDED_COLUMNS = {
+    # Content-addressed downloads
+    "download": [("sha256", "TEXT"), ("size", "INTEGER")],
+    # Cursors from before this was recorded cover an unknown range
+    "channel_cursor": [("scanned_from", "INTEGER")],
+}
+
+
+class ScanState:
+    """Local SQLite record of how far each channel has been scanned.
+
+    Stores the newest fully processed message ID per channel, so later runs can
+    page only the messages after it, and the attachments already downloaded
+    with the content digest and size they were stored under.
+
+    Each cursor also records the message ID its scan started after. Every
+    message between the two has been processed, so a later run can only
+    resume from the cursor if it starts inside that range.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        for table, added_columns in ADDED_COLUMNS.items():
+            columns = {
+                row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")
+            }
+            for column, column_type in added_columns:
+                if column not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+                    )
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def get_cursor(self, channel_id):
+        row = self.connection.execute(
+            "SELECT scanned_from, last_message_id FROM channel_cursor "
+            "WHERE channel_id = ?",
+            (channel_id,),
+        ).fetchone()
+        return Cursor(*row) if row else None
+
+    def resume_from(self, channel_id, scanned_from):
+        """Return the message ID to continue a scan starting after ``scanned_from``.
+
+        If the saved cursor covers ``scanned_from`` the scan continues from it.
+        Otherwise the cursor is restarted at ``scanned_from``, so it describes
+        this scan from now on.
+        """
+        cursor = self.get_cursor(channel_id)
+        if (
+            cursor is not None
+            and cursor.scanned_from is not None
+            and cursor.scanned_from <= scanned_from <= cursor.last_message_id
+        ):
+            return cursor.last_message_id
+        self.reset_cursor(channel_id, scanned_from)
+        return scanned_from
+
+    def reset_cursor(self, channel_id, scanned_from):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO channel_cursor "
+                "(channel_id, scanned_from, last_message_id) VALUES (?, ?, ?)",
+                (channel_id, scanned_from, scanned_from),
+            )
+
+    def set_cursor(self, channel_id, message_id):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO channel_cursor (channel_id, last_message_id) "
+                "VALUES (?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET "
+                "last_message_id = MAX(last_message_id, excluded.last_message_id)",
+                (channel_id, message_id),
+            )
+
+    def get_download(self, key):
+        """Return where an attachment was saved, its digest and size, or None."""
+        row = self.connection.execute(
+            "SELECT path, sha256, size FROM download WHERE key = ?", (key,)
+        ).fetchone()
+        return Download(*row) if row else None
+
+    def record_download(
+        self, key, channel_id, message_id, path, sha256=None, size=None
+    ):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO download "
+                "(key, channel_id, message_id, path, sha256, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, channel_id, message_id, str(path), sha256, size),
+            )
+
+
+class ChannelCursor:
+    """Advance a channel's saved cursor only past fully processed messages.
+
+    Messages are added in history order with the number of downloads they are
+    waiting on. Downloads finish out of order, so the cursor moves to the newest
+    message with nothing outstanding before it, and stops at the first failed
+    download so the next run retries it.
+    """
+
+    def __init__(self, state, channel_id):
+        self.state = state
+        self.channel_id = channel_id
+        self.pending = OrderedDict()
+        self.failed = set()
+
+    def add(self, message_id, downloads=0):
+        self.pending[message_id] = downloads
+        self.advance()
+
+    def done(self, message_id, ok=True):
+        self.pending[message_id] -= 1
+        if not ok:
+            self.failed.add(message_id)
+        self.advance()
+
+    def advance(self):
+        last_message_id = None
+        while self.pending:
+            message_id, remaining = next(iter(self.pending.items()))
+            if remaining or message_id in self.failed:
+                break
+            self.pending.popitem(last=False)
+            last_message_id = message_id
+        if last_message_id is not None:
+            self.state.set_cursor(self.channel_id, last_message_id)
@@ -0,0 +1,52 @@
+import heapq
+
+
+class NotificationSchedule:
+    """Unsent SessionNotifications ordered by ``send_by`` in a min-heap.
+
+    Updating a notification pushes a new heap entry and leaves the old one in
+    place; entries that no longer match the stored notification are discarded
+    when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._notifications = {}
+
+    def __len__(self):
+        return len(self._notifications)
+
+    def clear(self):
+        self._heap = []
+        self._notifications = {}
+
+    def upsert(self, notification):
+        if notification.sent:
+            self.remove(notification.id)
+            return
+        self._notifications[notification.id] = notification
+        heapq.heappush(self._heap, (notification.send_by, notification.id))
+
+    def remove(self, notification_id):
+        self._notifications.pop(notification_id, None)
+
+    def peek(self):
+        """Return the next notification to send, dropping stale heap entries."""
+        while self._heap:
+            send_by, notification_id = self._heap[0]
+            notification = self._notifications.get(notification_id)
+            if notification is not None and notification.send_by == send_by:
+                return notification
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, latest):
+        """Remove and return every notification with ``send_by`` up to ``latest``."""
+        due = []
+        while (notification := self.peek()) is not None:
+            if notification.send_by > latest:
+                break
+            heapq.heappop(self._heap)
+            del self._notifications[notification.id]
+            due.append(notification)
+        return due
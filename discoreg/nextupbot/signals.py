@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import SessionNotification
+from .notify import notify_changed
+
+
+@receiver(post_save, sender=SessionNotification)
+@receiver(post_delete, sender=SessionNotification)
+def session_notification_changed(sender, instance, **kwargs):
+    notification_id = instance.id
+    transaction.on_commit(lambda: notify_changed(notification_id))
+
+
+@receiver(m2m_changed, sender=SessionNotification.channels.through)
+def session_notification_channels_changed(sender, instance, **kwargs):
+    if isinstance(instance, SessionNotification):
+        session_notification_changed(SessionNotification, instance)
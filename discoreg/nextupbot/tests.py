@@ -1,3 +1,654 @@
-from django.test import TestCase
+import asyncio
+import json
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import discord
+import piexif
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+from registrations.discord_api import DiscordAPIError
+from registrations.models import DiscordServer
+
+from nextupbot import jpeg
+from nextupbot.embeds import build_embed_payload, encode_embed
+from nextupbot.grantlog import GrantLog
+from nextupbot.management.commands import imagescan, nextupbot
+from nextupbot.models import DiscordChannel, SessionNotification
+from nextupbot.resthistory import RestChannel, RestMessage
+from nextupbot.scanstate import ScanState
+
+
+class ReplicaBotClient(nextupbot.BotClient):
+    """BotClient with the gateway stubbed out so several can share one loop."""
+
+    def __init__(self, replica_id, sends):
+        super().__init__(intents=discord.Intents.none())
+        self.replica_id = replica_id
+        self.sends = sends
+        self.stopped = False
+
+    async def wait_until_ready(self):
+        pass
+
+    async def send_to_channel(self, channel_id, body):
+        await asyncio.sleep(0.01)
+        self.sends.append(json.loads(body)["embeds"][0]["title"])
+
+    def is_closed(self):
+        return self.stopped
+
+
+class NotificationClaimTests(TransactionTestCase):
+    def create_notifications(self, count, delay_seconds=0.5):
+        window = timedelta(seconds=nextupbot.DISCORD_BOT_WINDOW_SECONDS)
+        send_by = timezone.now() + window + timedelta(seconds=delay_seconds)
+        return [
+            SessionNotification.objects.create(title=f"Session {n}", send_by=send_by)
+            for n in range(count)
+        ]
+
+    def test_replicas_send_each_notification_once(self):
+        notifications = self.create_notifications(20)
+        sends = []
+
+        async def run_replicas():
+            bots = [ReplicaBotClient(f"replica-{n}", sends) for n in range(4)]
+            tasks = [asyncio.create_task(bot.my_background_task()) for bot in bots]
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                if len(sends) >= len(notifications):
+                    break
+            await asyncio.sleep(0.2)
+            for bot in bots:
+                bot.stopped = True
+                bot.schedule_changed.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        with self.assertLogs(nextupbot.logger, level="INFO") as logs:
+            asyncio.run(run_replicas())
+
+        self.assertEqual(
+            Counter(sends),
+            Counter(notification.title for notification in notifications),
+        )
+        self.assertEqual(
+            sum("sent notification" in line for line in logs.output),
+            len(notifications),
+        )
+        self.assertFalse(SessionNotification.objects.filter(sent=False).exists())
+
+    @mock.patch.object(nextupbot, "DISCORD_BOT_RETRY_SECONDS", 0.1)
+    def test_failed_send_is_retried(self):
+        (notification,) = self.create_notifications(1)
+        sends = []
+
+        class FailOnceBotClient(ReplicaBotClient):
+            attempts = 0
+
+            async def send_to_channel(self, channel_id, body):
+                self.attempts += 1
+                if self.attempts == 1:
+                    raise DiscordAPIError(500, "unavailable")
+                await super().send_to_channel(channel_id, body)
+
+        async def run_replica():
+            bot = FailOnceBotClient("replica", sends)
+            task = asyncio.create_task(bot.my_background_task())
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                if sends:
+                    break
+            bot.stopped = True
+            bot.schedule_changed.set()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return bot.attempts
+
+        with self.assertLogs(nextupbot.logger, level="INFO"):
+            attempts = asyncio.run(run_replica())
+
+        self.assertEqual(attempts, 2)
+        self.assertEqual(sends, [notification.title])
+        notification.refresh_from_db()
+        self.assertTrue(notification.sent)
+
+    @mock.patch.object(nextupbot, "DISCORD_BOT_RETRY_SECONDS", 0.1)
+    def test_failed_channel_is_retried_alone(self):
+        (notification,) = self.create_notifications(1)
+        server = DiscordServer.objects.create(name="PyOhio", server_id="1")
+        notification.channels.set(
+            [
+                DiscordChannel.objects.create(
+                    name=name, discord_channel_id=channel_id, discord_server=server
+                )
+                for name, channel_id in (("main", "101"), ("sister", "102"))
+            ]
+        )
+        posts = []
+
+        class FlakyChannelBotClient(ReplicaBotClient):
+            async def send_to_channel(self, channel_id, body):
+                posts.append(channel_id)
+                if channel_id == 102 and posts.count(102) == 1:
+                    raise DiscordAPIError(503, "unavailable")
+
+        async def run_replica():
+            bot = FlakyChannelBotClient("replica", [])
+            task = asyncio.create_task(bot.my_background_task())
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                if posts.count(102) == 2:
+                    break
+            await asyncio.sleep(0.1)
+            bot.stopped = True
+            bot.schedule_changed.set()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        with self.assertLogs(nextupbot.logger, level="INFO") as logs:
+            asyncio.run(run_replica())
+
+        self.assertEqual(Counter(posts), {101: 1, 102: 2})
+        self.assertIn("ERROR", {record.levelname for record in logs.records})
+        notification.refresh_from_db()
+        self.assertTrue(notification.sent)
+        self.assertEqual(
+            set(
+                notification.deliveries.values_list(
+                    "channel__discord_channel_id", flat=True
+                )
+            ),
+            {"101", "102"},
+        )
+
+    def test_concurrent_claims_do_not_overlap(self):
+        notification_ids = [n.id for n in self.create_notifications(50)]
+        replica_count = 5
+        barrier = threading.Barrier(replica_count)
+        claimed = {}
+
+        def claim(replica_id):
+            barrier.wait()
+            try:
+                # SQLite's shared in-memory test database reports lock contention
+                # instead of waiting, so retry until this replica gets its turn.
+                for _ in range(100):
+                    try:
+                        _, won = SessionNotification.objects.claim(
+                            notification_ids, replica_id, lease_seconds=60
+                        )
+                        break
+                    except OperationalError:
+                        time.sleep(0.01)
+                claimed[replica_id] = [notification.id for notification in won]
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=claim, args=(f"replica-{n}",))
+            for n in range(replica_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        claim_counts = Counter(
+            notification_id for won in claimed.values() for notification_id in won
+        )
+        self.assertEqual(len(claimed), replica_count)
+        self.assertEqual(set(claim_counts), set(notification_ids))
+        self.assertEqual(set(claim_counts.values()), {1})
+
+    def test_expired_claim_can_be_taken_over(self):
+        notification_ids = [n.id for n in self.create_notifications(3)]
+        _, first = SessionNotification.objects.claim(
+            notification_ids, "crashed", lease_seconds=60
+        )
+        _, blocked = SessionNotification.objects.claim(
+            notification_ids, "survivor", lease_seconds=60
+        )
+        SessionNotification.objects.update(
+            claim_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        _, taken_over = SessionNotification.objects.claim(
+            notification_ids, "survivor", lease_seconds=60
+        )
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(blocked, [])
+        self.assertEqual(len(taken_over), 3)
+
+
+class EmbedPayloadTests(SimpleTestCase):
+    def notification(self, **fields):
+        return SessionNotification(
+            **{"title": "Keynote", "send_by": timezone.now(), **fields}
+        )
+
+    def test_builds_the_discord_embed(self):
+        notification = self.notification(
+            url="https://pyohio.org/keynote",
+            description="In the main room",
+            color_hex_string="502962",
+            field_1_name="Speaker",
+            field_1_value="Ada",
+        )
+
+        self.assertEqual(
+            build_embed_payload(notification),
+            {
+                "title": "Keynote",
+                "color": 0x502962,
+                "url": "https://pyohio.org/keynote",
+                "description": "In the main room",
+                "author": {"name": "Up next:"},
+                "fields": [{"name": "Speaker", "value": "Ada", "inline": False}],
+            },
+        )
+        notification.clean()
+        self.assertEqual(
+            json.loads(encode_embed(notification)), build_embed_payload(notification)
+        )
+
+    def test_rejects_what_discord_would(self):
+        cases = {
+            "color_hex_string": {"color_hex_string": "purple"},
+            "title": {"title": "x" * 257},
+            "field_1_value": {"field_1_name": "Speaker"},
+            "field_2_name": {"field_2_value": "Ada"},
+            "field_3_value": {"field_3_name": "Room", "field_3_value": "x" * 1025},
+            "description": {
+                "description": "x" * 4000,
+                "field_1_name": "a",
+                "field_1_value": "x" * 1024,
+                "field_2_name": "b",
+                "field_2_value": "x" * 1024,
+                "field_3_name": "c",
+                "field_3_value": "x" * 1024,
+                "author_name": "x" * 256,
+            },
+        }
+        for field, values in cases.items():
+            with self.subTest(field=field):
+                notification = self.notification(**values)
+
+                with self.assertRaises(ValidationError) as raised:
+                    notification.clean()
+                self.assertEqual(list(raised.exception.message_dict), [field])
+                self.assertEqual(encode_embed(notification), "")
+
+
+HISTORY_START = datetime.now(dt_timezone.utc) - timedelta(days=30)
+# One message with an image every hour, oldest first
+HISTORY_IDS = [
+    discord.utils.time_snowflake(HISTORY_START + timedelta(hours=n)) + 1
+    for n in range(500)
+]
+
+
+def message_payload(message_id):
+    return {
+        "id": str(message_id),
+        "content": "",
+        "author": {"username": "attendee", "global_name": "Attendee"},
+        "attachments": [
+            {
+                "id": str(message_id + 1),
+                "url": f"https://cdn.example.com/{message_id}.jpg",
+                "filename": "photo.jpg",
+                "size": 1024,
+            }
+        ],
+        "embeds": [],
+    }
+
+
+def history_page(limit, before=None, after=None):
+    """Answer a message listing the way Discord does: newest first."""
+    if after is not None:
+        ids = [i for i in HISTORY_IDS if i > int(after)][:limit]
+    else:
+        ids = [i for i in HISTORY_IDS if before is None or i < int(before)][-limit:]
+    return [message_payload(message_id) for message_id in reversed(ids)]
+
+
+class FakeHistoryHTTP:
+    async def logs_from(self, channel_id, limit, before=None, after=None, around=None):
+        return history_page(limit, before, after)
+
+
+class FakeHistoryState:
+    http = FakeHistoryHTTP()
+
+    def create_message(self, channel, data):
+        return RestMessage(data, SimpleNamespace(id=1, guild_id=1))
+
+
+class FakeGatewayChannel(discord.abc.Messageable):
+    id = 1
+    name = "photos"
+    _state = FakeHistoryState()
+
+    async def _get_channel(self):
+        return self
+
+
+class FakeRestAPI:
+    async def get_channel_messages(
+        self, channel_id, limit=100, before=None, after=None
+    ):
+        return history_page(limit, before, after)
+
+
+class ImageScanHistoryTests(SimpleTestCase):
+    def scan(self, scanner, channel):
+        asyncio.run(scanner.scan_channel_history(channel, None, None, None))
+        return [record.message_id for record in scanner.image_records]
+
+    def scanner_options(self, limit):
+        return {
+            "channel_ids": [1],
+            "guild_id": None,
+            "include_threads": False,
+            "channel_concurrency": 1,
+            "limit": limit,
+            "download": False,
+            "download_dir": "unused",
+            "concurrency": 1,
+            "tag_workers": 1,
+            "resume": False,
+            "state_file": None,
+            "show_embeds": False,
+            "verbose": False,
+            "table": True,
+            "exporter": None,
+            "from_dt": HISTORY_START - timedelta(days=1),
+            "to_dt": None,
+        }
+
+    def test_gateway_and_rest_scan_the_same_newest_messages(self):
+        gateway = imagescan.ImageScannerClient(**self.scanner_options(limit=150))
+        rest = imagescan.RestImageScanner("token", **self.scanner_options(limit=150))
+        rest.api = FakeRestAPI()
+
+        gateway_ids = self.scan(gateway, FakeGatewayChannel())
+        rest_ids = self.scan(
+            rest, RestChannel({"id": "1", "name": "photos", "type": 0, "guild_id": "1"})
+        )
+
+        self.assertEqual(gateway_ids, rest_ids)
+        self.assertEqual(sorted(gateway_ids), HISTORY_IDS[-150:])
+
+    def test_download_with_limit_keeps_the_newest_messages(self):
+        options = self.scanner_options(limit=150)
+        options.update(download=True, resume=True)
+        scanner = imagescan.ImageScannerClient(**options)
+        scanner.state = ScanState(":memory:")
+        self.addCleanup(scanner.state.close)
+
+        async def run():
+            queue = asyncio.Queue()
+            await scanner.scan_channel_history(FakeGatewayChannel(), None, None, queue)
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        queued = asyncio.run(run())
+
+        self.assertEqual(
+            sorted(record.message_id for record, _ in queued), HISTORY_IDS[-150:]
+        )
+        self.assertIsNone(scanner.state.get_cursor(1))
+
+
+class ImageScanDownloadWorkerTests(SimpleTestCase):
+    scanner_options = ImageScanHistoryTests.scanner_options
+
+    def record(self, key):
+        return SimpleNamespace(
+            url=f"https://cdn.example.com/{key}.jpg",
+            filename=f"{key}.jpg",
+            message_id=1,
+            username="attendee",
+            timestamp=HISTORY_START,
+            index=1,
+            key=key,
+            channel_id=1,
+            size=10,
+        )
+
+    def test_failed_lookup_does_not_stop_the_worker(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        stored = Path(directory.name) / "stored.jpg"
+        stored.write_bytes(bytes(10))
+        downloads = {"good": SimpleNamespace(sha256="abc", path=str(stored), size=10)}
+
+        def get_download(key):
+            if key == "bad":
+                raise OSError("disk I/O error")
+            return downloads[key]
+
+        scanner = imagescan.ImageScannerClient(**self.scanner_options(limit=None))
+        scanner.download_dir = directory.name
+        scanner.state = mock.Mock(get_download=get_download)
+        scanner.store = mock.Mock()
+
+        async def run():
+            queue = asyncio.Queue(maxsize=1)
+            worker = asyncio.create_task(
+                scanner.download_worker(None, queue, asyncio.Queue(), None, None)
+            )
+            for key in ("bad", "good", "bad"):
+                await asyncio.wait_for(queue.put((self.record(key), None)), 1)
+            await asyncio.wait_for(queue.join(), 1)
+            await queue.put(None)
+            await worker
+
+        with mock.patch.object(imagescan, "console") as console:
+            asyncio.run(run())
+
+        self.assertEqual(scanner.download_results, {"failed": 2, "skipped": 1})
+        self.assertIn("disk I/O error", console.print.call_args.args[0])
+
+
+class ScanStateCursorTests(SimpleTestCase):
+    def setUp(self):
+        self.state = ScanState(":memory:")
+        self.addCleanup(self.state.close)
+
+    def test_resumes_inside_the_scanned_range(self):
+        self.state.reset_cursor(1, 100)
+        self.state.set_cursor(1, 500)
+
+        self.assertEqual(self.state.resume_from(1, 100), 500)
+        self.assertEqual(self.state.resume_from(1, 300), 500)
+
+    def test_earlier_start_ignores_a_narrower_scan(self):
+        self.state.reset_cursor(1, 400)
+        self.state.set_cursor(1, 500)
+
+        self.assertEqual(self.state.resume_from(1, 100), 100)
+        self.assertEqual(self.state.get_cursor(1), (100, 100))
+
+    def test_start_past_the_cursor_does_not_leave_a_gap(self):
+        self.state.reset_cursor(1, 100)
+        self.state.set_cursor(1, 200)
+
+        self.assertEqual(self.state.resume_from(1, 300), 300)
+        self.assertEqual(self.state.get_cursor(1), (300, 300))
+
+
+class GrantLogTests(SimpleTestCase):
+    def test_close_waits_for_the_flush_in_progress(self):
+        posted = []
+        role = SimpleNamespace(id=10)
+        members = [SimpleNamespace(id=n) for n in range(3)]
+
+        async def run():
+            sending = asyncio.Event()
+
+            async def send(text):
+                sending.set()
+                await asyncio.sleep(0.05)
+                posted.append(text)
+
+            grant_log = GrantLog(send, flush_seconds=60, flush_events=1)
+            grant_log.start()
+            grant_log.record(role, members[0])
+            await sending.wait()
+            # Arrives while the first summary is still being sent
+            grant_log.record(role, members[1])
+            grant_log.record(role, members[2])
+            await grant_log.close()
+
+        with self.assertLogs("nextupbot.audit", level="INFO") as audit:
+            asyncio.run(run())
+
+        self.assertEqual(len(audit.records), 3)
+        self.assertEqual(
+            posted,
+            [
+                "Added role <@&10> to 1 members: <@0>",
+                "Added role <@&10> to 2 members: <@1> <@2>",
+            ],
+        )
+
+
+ATTRIBUTION = jpeg.Attribution("Ada", 1234, datetime(2025, 7, 26, 12, 30))
+SCAN_DATA = (
+    b"\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00" + bytes(range(256)) + b"\xff\xd9"
+)
+
+
+def jpeg_file(*segments):
+    """A JPEG with the given (marker, payload) header segments and fake scan data."""
+    header = b"".join(
+        jpeg.encode_segment(marker, payload) for marker, payload in segments
+    )
+    return jpeg.SOI + header + SCAN_DATA
+
+
+def header_segments(data):
+    """Return the (marker, payload) segments before the start of scan."""
+    segments = []
+    position = 2
+    while data[position + 1] != jpeg.SOS:
+        (length,) = struct.unpack(">H", data[position + 2 : position + 4])
+        segments.append(
+            (data[position + 1], data[position + 4 : position + 2 + length])
+        )
+        position += 2 + length
+    return segments
+
+
+def iptc_datasets(photoshop):
+    """Map IPTC (record, dataset) numbers to values in an APP13 payload."""
+    (iptc,) = [
+        data
+        for resource_id, _, data in jpeg.parse_photoshop_resources(photoshop)
+        if resource_id == jpeg.IPTC_RESOURCE_ID
+    ]
+    datasets = {}
+    position = 0
+    while position < len(iptc):
+        (length,) = struct.unpack(">H", iptc[position + 3 : position + 5])
+        key = (iptc[position + 1], iptc[position + 2])
+        datasets.setdefault(key, []).append(iptc[position + 5 : position + 5 + length])
+        position += 5 + length
+    return datasets
+
+
+class JpegAttributionWriterTests(SimpleTestCase):
+    def rewrite(self, data, chunk_size=None):
+        writer = jpeg.JpegAttributionWriter(ATTRIBUTION)
+        chunk_size = chunk_size or len(data)
+        output = b"".join(
+            writer.feed(data[start : start + chunk_size])
+            for start in range(0, len(data), chunk_size)
+        )
+        return output + writer.close(), writer.tagged
+
+    def test_merges_into_existing_exif(self):
+        exif = piexif.dump(
+            {
+                "0th": {
+                    piexif.ImageIFD.Make: b"Canon",
+                    piexif.ImageIFD.Artist: b"Original photographer",
+                }
+            }
+        )
+        data = jpeg_file((jpeg.APP0, b"JFIF\x00\x01\x01"), (jpeg.APP1, exif))
+
+        output, tagged = self.rewrite(data)
+
+        self.assertTrue(tagged)
+        segments = header_segments(output)
+        self.assertEqual(segments[0], (jpeg.APP0, b"JFIF\x00\x01\x01"))
+        (app1,) = [payload for marker, payload in segments if marker == jpeg.APP1]
+        image_ifd = piexif.load(app1)["0th"]
+        self.assertEqual(image_ifd[piexif.ImageIFD.Make], b"Canon")
+        self.assertEqual(image_ifd[piexif.ImageIFD.Artist], b"Original photographer")
+        self.assertEqual(image_ifd[piexif.ImageIFD.Copyright], b"Uploaded by Ada")
+        self.assertTrue(output.endswith(SCAN_DATA))
+
+    def test_merges_into_existing_iptc(self):
+        iptc = jpeg.encode_iptc_dataset(2, 25, b"keynote") + jpeg.encode_iptc_dataset(
+            2, jpeg.IPTC_BY_LINE, b"Someone else"
+        )
+        photoshop = jpeg.PHOTOSHOP_HEADER + (
+            jpeg.encode_photoshop_resource(0x03ED, b"", b"\x00\x48\x00\x01")
+            + jpeg.encode_photoshop_resource(jpeg.IPTC_RESOURCE_ID, b"", iptc)
+        )
+        data = jpeg_file((jpeg.APP13, photoshop))
+
+        output, tagged = self.rewrite(data)
+
+        self.assertTrue(tagged)
+        (app13,) = [
+            payload
+            for marker, payload in header_segments(output)
+            if marker == jpeg.APP13
+        ]
+        resource_ids = [r[0] for r in jpeg.parse_photoshop_resources(app13)]
+        self.assertEqual(resource_ids, [0x03ED, jpeg.IPTC_RESOURCE_ID])
+        datasets = iptc_datasets(app13)
+        self.assertEqual(datasets[(2, 25)], [b"keynote"])
+        self.assertEqual(datasets[(2, jpeg.IPTC_BY_LINE)], [b"Ada"])
+
+    def test_tiny_chunks_split_segment_headers(self):
+        data = jpeg_file(
+            (jpeg.APP0, b"JFIF\x00\x01\x01"), (0xDB, bytes(65)), (0xC0, bytes(15))
+        )
+        expected, _ = self.rewrite(data)
+
+        for chunk_size in (1, 2, 3, 5):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.rewrite(data, chunk_size), (expected, True))
+
+    def test_non_jpeg_passes_through(self):
+        png = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+        for chunk_size in (1, 7, len(png)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.rewrite(png, chunk_size), (png, False))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "photo.jpg"
+            path.write_bytes(png)
+
+            self.assertFalse(jpeg.tag_file(str(path), ATTRIBUTION, chunk_size=16))
+            self.assertEqual(path.read_bytes(), png)
+            self.assertEqual(list(Path(directory).iterdir()), [path])
@@ -1,7 +1,15 @@
 from django.contrib import admin
 
-from .models import DiscordRole, DiscordServer, EmailRole, Registration
+from .models import DiscordJob, DiscordRole, DiscordServer, EmailRole, Registration
 
+
+class DiscordJobAdmin(admin.ModelAdmin):
+    list_display = ("idempotency_key", "kind", "status", "attempts", "run_after")
+    list_filter = ("status", "kind")
+    exclude = ("access_token",)
+
+
+admin.site.register(DiscordJob, DiscordJobAdmin)
 admin.site.register(DiscordRole)
 admin.site.register(DiscordServer)
 admin.site.register(EmailRole)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RegistrationsConfig(AppConfig):
     name = "registrations"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAJOR_PARAMETER_PATTERN = re.compile(r"^/(channels|guilds|webhooks)/(\d+)")
+ID_PATTERN = re.compile(r"/\d+")
+
+
+class DiscordAPIError(Exception):
+    """Raised when Discord responds to a request with an error status."""
+
+    def __init__(self, status, body=None):
+        self.status = status
+        self.body = body
+        super().__init__(f"Discord API returned HTTP {status}: {body}")
+
+
+class RateLimitBucket:
+    """Request allowance for one Discord rate limit bucket."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.remaining = None
+        self.reset_at = 0.0
+
+    def update(self, remaining, reset_after):
+        self.remaining = remaining
+        self.reset_at = time.monotonic() + reset_after
+
+
+def route_key(method, path):
+    """Identify the rate limit route of a request before Discord names its bucket.
+
+    Discord limits routes per major parameter (channel, guild or webhook ID), so
+    the major ID is kept and any other IDs in the path are collapsed.
+    """
+    match = MAJOR_PARAMETER_PATTERN.match(path)
+    major = match.group(0) if match else ""
+    minor = ID_PATTERN.sub("/:id", path[len(major) :])
+    return f"{method} {major}{minor}", major
+
+
+class DiscordClient:
+    """Async Discord REST client sharing one pooled HTTP session.
+
+    The session is created lazily inside the running event loop so one client
+    (and its keep-alive connections) can be reused by every request handled by
+    an ASGI worker, worker process or bot.
+
+    Requests are paced using Discord's ``X-RateLimit-*`` headers: each bucket's
+    remaining allowance is tracked, requests wait for the bucket (or the global
+    limit) to reset instead of being rejected, and 429 responses are retried
+    after ``retry_after``. ``throttle_counts`` records how often each bucket made
+    a request wait.
+    """
+
+    def __init__(
+        self,
+        api_base_url,
+        bot_token,
+        guild_id,
+        client_id=None,
+        client_secret=None,
+        token_url=None,
+        pool_size=100,
+        timeout=10,
+        max_retries=5,
+    ):
+        self.api_base_url = api_base_url.rstrip("/")
+        self.bot_token = bot_token
+        self.guild_id = guild_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url or f"{self.api_base_url}/oauth2/token"
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.throttle_counts = Counter()
+        self.loop = None
+        self.closer = None
+        self._session = None
+        self._route_buckets = {}
+        self._buckets = {}
+        self._global_reset_at = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            api_base_url=settings.DISCORD_API_BASE_URL,
+            bot_token=settings.DISCORD_BOT_TOKEN,
+            guild_id=settings.DISCORD_GUILD_ID,
+            client_id=settings.DISCORD_CLIENT_ID,
+            client_secret=settings.DISCORD_CLIENT_SECRET,
+            token_url=settings.DISCORD_TOKEN_URL,
+            pool_size=settings.DISCORD_HTTP_POOL_SIZE,
+            timeout=settings.DISCORD_HTTP_TIMEOUT_SECONDS,
+            max_retries=settings.DISCORD_HTTP_MAX_RETRIES,
+        )
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self.loop = asyncio.get_running_loop()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    @property
+    def closed(self):
+        return self._session is not None and self._session.closed
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    @property
+    def bot_headers(self):
+        return {"Authorization": f"Bot {self.bot_token}"}
+
+    def get_bucket(self, route, major):
+        bucket_hash = self._route_buckets.get(route)
+        key = f"{bucket_hash}:{major}" if bucket_hash else route
+        if key not in self._buckets:
+            self._buckets[key] = RateLimitBucket()
+        return key, self._buckets[key]
+
+    async def wait_for_bucket(self, key, bucket):
+        async with bucket.lock:
+            while True:
+                now = time.monotonic()
+                delay = max(self._global_reset_at, bucket.reset_at) - now
+                if self._global_reset_at <= now and (
+                    bucket.remaining is None or bucket.remaining > 0
+                ):
+                    break
+                if delay <= 0:
+                    bucket.remaining = None
+                    break
+                self.throttle_counts[key] += 1
+                logger.warning(f"Discord rate limit {key}: waiting {delay:.2f}s")
+                await asyncio.sleep(delay)
+            if bucket.remaining is not None:
+                bucket.remaining -= 1
+
+    def update_bucket(self, route, major, response):
+        bucket_hash = response.headers.get("X-RateLimit-Bucket")
+        if bucket_hash is None:
+            return
+        self._route_buckets[route] = bucket_hash
+        _, bucket = self.get_bucket(route, major)
+        try:
+            bucket.update(
+                int(response.headers["X-RateLimit-Remaining"]),
+                float(response.headers["X-RateLimit-Reset-After"]),
+            )
+        except (KeyError, ValueError):
+            pass
+
+    async def request(self, method, path, headers=None, **kwargs):
+        url = f"{self.api_base_url}{path}"
+        route, major = route_key(method, path)
+        for attempt in range(self.max_retries + 1):
+            key, bucket = self.get_bucket(route, major)
+            await self.wait_for_bucket(key, bucket)
+            async with self.session.request(
+                method, url, headers=headers, **kwargs
+            ) as response:
+                self.update_bucket(route, major, response)
+                if response.content_type == "application/json":
+                    body = await response.json()
+                else:
+                    body = await response.text()
+            if response.status == 429 and attempt < self.max_retries:
+                self.handle_rate_limited(route, major, response, body)
+                continue
+            if response.status >= 400:
+                raise DiscordAPIError(response.status, body)
+            return response.status, body
+
+    def handle_rate_limited(self, route, major, response, body):
+        retry_after = None
+        if isinstance(body, dict):
+            retry_after = body.get("retry_after")
+        if retry_after is None:
+            retry_after = float(response.headers.get("Retry-After", 1))
+        is_global = (isinstance(body, dict) and body.get("global")) or (
+            response.headers.get("X-RateLimit-Global") == "true"
+        )
+        reset_at = time.monotonic() + float(retry_after)
+        key, bucket = self.get_bucket(route, major)
+        if is_global:
+            key = "global"
+            self._global_reset_at = reset_at
+        else:
+            bucket.remaining = 0
+            bucket.reset_at = reset_at
+        self.throttle_counts[key] += 1
+        logger.warning(f"Discord returned 429 for {key}, retrying in {retry_after}s")
+
+    async def exchange_code(self, code, redirect_uri):
+        """Exchange an OAuth authorization code for the user's access token."""
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": redirect_uri,
+        }
+        async with self.session.post(self.token_url, data=data) as response:
+            body = await response.json(content_type=None)
+            if response.status >= 400:
+                raise DiscordAPIError(response.status, body)
+            return body
+
+    async def get_user(self, token):
+        _, user = await self.request(
+            "GET",
+            "/users/@me",
+            headers={"Authorization": f"Bearer {token['access_token']}"},
+        )
+        return user
+
+    async def add_user_to_guild(self, user_id, token, role_ids=()):
+        """Add a user to a server (guild).
+
+        Requires server user management and the user's permission. Roles passed
+        here are applied by Discord as part of the join. Returns 201 when the user
+        was added and 204 when they were already a member, in which case Discord
+        ignores ``roles``.
+        """
+        payload = {"access_token": token["access_token"]}
+        if role_ids:
+            payload["roles"] = list(role_ids)
+        status, _ = await self.request(
+            "PUT",
+            f"/guilds/{self.guild_id}/members/{user_id}",
+            headers=self.bot_headers,
+            json=payload,
+        )
+        return status
+
+    async def add_user_to_role(self, user_id, role_id):
+        """Add a role to a user. Requires server role management."""
+        status, _ = await self.request(
+            "PUT",
+            f"/guilds/{self.guild_id}/members/{user_id}/roles/{role_id}",
+            headers=self.bot_headers,
+            json={},
+        )
+        return status
+
+    async def add_user_to_roles(self, user_id, role_ids):
+        """Add several roles to an existing member, one request per role.
+
+        Each role is added on its own rather than by PATCHing the member's whole
+        role list, which would undo roles that moderators or other bots change
+        between reading the list and writing it back.
+        """
+        await asyncio.gather(
+            *(self.add_user_to_role(user_id, role_id) for role_id in role_ids)
+        )
+
+    async def join_guild(self, user_id, token, role_ids):
+        """Add a user to the guild with their roles in one request.
+
+        Falls back to adding each role when the user had already joined.
+        """
+        role_ids = [str(role_id) for role_id in role_ids]
+        status = await self.add_user_to_guild(user_id, token, role_ids)
+        if status == 204 and role_ids:
+            await self.add_user_to_roles(user_id, role_ids)
+
+    async def create_message(self, channel_id, body):
+        """Post a message whose JSON body has already been encoded."""
+        _, message = await self.request(
+            "POST",
+            f"/channels/{channel_id}/messages",
+            headers={**self.bot_headers, "Content-Type": "application/json"},
+            data=body,
+        )
+        return message
+
+    async def get_channel(self, channel_id):
+        _, channel = await self.request(
+            "GET", f"/channels/{channel_id}", headers=self.bot_headers
+        )
+        return channel
+
+    async def get_guild_channels(self, guild_id):
+        """List a guild's channels and categories. Threads are not included."""
+        _, channels = await self.request(
+            "GET", f"/guilds/{guild_id}/channels", headers=self.bot_headers
+        )
+        return channels
+
+    async def get_active_threads(self, guild_id):
+        _, body = await self.request(
+            "GET", f"/guilds/{guild_id}/threads/active", headers=self.bot_headers
+        )
+        return body["threads"]
+
+    async def get_archived_threads(self, channel_id, before=None, limit=100):
+        """Return a page of public archived threads, most recently archived first.
+
+        ``before`` is an ISO 8601 archive timestamp. The response's ``has_more``
+        says whether another page follows.
+        """
+        params = {"limit": limit}
+        if before:
+            params["before"] = before
+        _, body = await self.request(
+            "GET",
+            f"/channels/{channel_id}/threads/archived/public",
+            headers=self.bot_headers,
+            params=params,
+        )
+        return body
+
+    async def get_channel_messages(
+        self, channel_id, limit=100, before=None, after=None
+    ):
+        """Return up to 100 messages, newest first, around the given message IDs."""
+        params = {"limit": limit}
+        if before is not None:
+            params["before"] = before
+        if after is not None:
+            params["after"] = after
+        _, messages = await self.request(
+            "GET",
+            f"/channels/{channel_id}/messages",
+            headers=self.bot_headers,
+            params=params,
+        )
+        return messages
+
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide client, recreating it for a new event loop.
+
+    Each client's session is closed when its loop shuts down, so short-lived
+    loops (one per request under ``async_to_sync``) do not leak sessions.
+    """
+    global _client
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.closed or _client.loop not in (None, loop):
+        _client = DiscordClient.from_settings()
+        _client.loop = loop
+        _client.closer = loop.create_task(close_at_shutdown(_client))
+    return _client
+
+
+async def close_at_shutdown(client):
+    """Wait until the loop cancels its remaining tasks on shutdown, then close."""
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.close()
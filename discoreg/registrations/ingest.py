@@ -0,0 +1,123 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DiscordRole, EmailRole, Registration
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLE_IDS_CACHE_KEY = "registrations:default-role-ids"
+DEFAULT_ROLES_CACHE_SECONDS = settings.DEFAULT_ROLES_CACHE_SECONDS
+
+
+def get_default_role_ids():
+    """Return IDs of roles assigned by default, cached for a few minutes.
+
+    Saving or deleting a DiscordRole clears the cache only in the process that
+    made the change. The cache is local to each process, so other web workers
+    keep their copy for up to ``DEFAULT_ROLES_CACHE_SECONDS``. Registrations
+    ingested in that window get the previous default roles.
+    """
+    role_ids = cache.get(DEFAULT_ROLE_IDS_CACHE_KEY)
+    if role_ids is None:
+        role_ids = list(
+            DiscordRole.objects.filter(assign_by_default=True).values_list(
+                "id", flat=True
+            )
+        )
+        cache.set(DEFAULT_ROLE_IDS_CACHE_KEY, role_ids, DEFAULT_ROLES_CACHE_SECONDS)
+    return role_ids
+
+
+def invalidate_default_role_ids():
+    cache.delete(DEFAULT_ROLE_IDS_CACHE_KEY)
+
+
+def parse_tickets(payload):
+    """Extract (email, reference_id) pairs from a Tito webhook payload.
+
+    Accepts a single ticket, a registration with a ``tickets`` list (group
+    purchases) or a JSON list of either. Unassigned tickets in a registration
+    fall back to the registration's email. Tickets with no email at all are
+    skipped, since there is nobody to match them to.
+    """
+    if isinstance(payload, list):
+        return [ticket for item in payload for ticket in parse_tickets(item)]
+    parsed = []
+    for ticket in payload.get("tickets") or [payload]:
+        reference_id = get_reference_id(ticket)
+        email = ticket.get("email") or payload.get("email")
+        if email:
+            parsed.append((email, reference_id))
+        else:
+            logger.warning(f"Skipping Tito ticket {reference_id} without an email")
+    return parsed
+
+
+def get_reference_id(ticket):
+    return ticket.get("reference_id") or ticket["reference"]
+
+
+def get_or_create_email_roles(emails):
+    """Return EmailRoles keyed by lowercased email, creating any that are missing."""
+    email_roles = {
+        email_role.email.lower(): email_role
+        for email_role in EmailRole.objects.for_emails(emails)
+    }
+    missing = {email.lower() for email in emails} - email_roles.keys()
+    if missing:
+        EmailRole.objects.bulk_create(
+            [EmailRole(email=email) for email in missing], ignore_conflicts=True
+        )
+        email_roles.update(
+            (email_role.email.lower(), email_role)
+            for email_role in EmailRole.objects.for_emails(missing)
+        )
+    return email_roles
+
+
+def add_default_roles(email_roles):
+    """Attach the default roles to EmailRoles with one M2M insert."""
+    Through = EmailRole.discord_roles.through
+    default_role_ids = get_default_role_ids()
+    Through.objects.bulk_create(
+        [
+            Through(emailrole_id=email_role.id, discordrole_id=role_id)
+            for email_role in email_roles
+            for role_id in default_role_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def ingest_tickets(tickets, email_role_ids=None):
+    """Record Tito tickets, given as (email, reference_id) pairs, in one transaction.
+
+    Registrations are inserted with ON CONFLICT DO NOTHING on ``reference_id``, so
+    replayed webhooks and re-imported tickets leave existing rows untouched.
+    ``email_role_ids`` maps lowercased emails to EmailRole IDs already ingested,
+    so bulk imports can skip the lookups and role inserts for repeated emails.
+    It is updated in place.
+    """
+    if email_role_ids is None:
+        email_role_ids = {}
+    new_emails = {email.lower() for email, _ in tickets} - email_role_ids.keys()
+    if new_emails:
+        email_roles = get_or_create_email_roles(new_emails)
+        add_default_roles(email_roles.values())
+        email_role_ids.update(
+            (email, email_role.id) for email, email_role in email_roles.items()
+        )
+    Registration.objects.bulk_create(
+        [
+            Registration(
+                email_id=email_role_ids[email.lower()], reference_id=reference_id
+            )
+            for email, reference_id in tickets
+        ],
+        ignore_conflicts=True,
+    )
+    return email_role_ids
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import aiohttp
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .discord_api import DiscordAPIError
+from .models import DiscordJob
+
+logger = logging.getLogger(__name__)
+
+DISCORD_JOB_BACKOFF_SECONDS = settings.DISCORD_JOB_BACKOFF_SECONDS
+DISCORD_JOB_LEASE_SECONDS = settings.DISCORD_JOB_LEASE_SECONDS
+DISCORD_JOB_MAX_ATTEMPTS = settings.DISCORD_JOB_MAX_ATTEMPTS
+DISCORD_JOB_MAX_BACKOFF_SECONDS = settings.DISCORD_JOB_MAX_BACKOFF_SECONDS
+
+
+def enqueue_guild_join(discord_user_id, access_token, discord_roles):
+    """Queue a guild join plus one grant per role for a user.
+
+    Jobs are keyed on (discord_user_id, role), so linking again resets the
+    existing rows instead of adding duplicates.
+    """
+    now = timezone.now()
+    jobs = [
+        DiscordJob(
+            kind=DiscordJob.JOIN,
+            discord_user_id=discord_user_id,
+            idempotency_key=DiscordJob.make_idempotency_key(discord_user_id),
+            access_token=access_token,
+            run_after=now,
+        )
+    ]
+    for role in discord_roles:
+        jobs.append(
+            DiscordJob(
+                kind=DiscordJob.ROLE,
+                discord_user_id=discord_user_id,
+                discord_role_id=role.discord_role_id,
+                role_name=role.name,
+                idempotency_key=DiscordJob.make_idempotency_key(
+                    discord_user_id, role.discord_role_id
+                ),
+                run_after=now,
+            )
+        )
+    DiscordJob.objects.bulk_create(
+        jobs,
+        update_conflicts=True,
+        unique_fields=["idempotency_key"],
+        update_fields=[
+            "access_token",
+            "role_name",
+            "status",
+            "attempts",
+            "run_after",
+            "last_error",
+            "updated_at",
+        ],
+    )
+    return jobs
+
+
+def claim_jobs(limit):
+    """Lease every due job of up to ``limit`` users to this worker.
+
+    A user's join and role jobs are always claimed together, so their roles can
+    be granted with the join instead of after it. Claimed jobs are marked running
+    with ``run_after`` pushed out by the lease, so jobs held by a worker that
+    dies become due again once the lease expires.
+    """
+    now = timezone.now()
+    due = DiscordJob.objects.filter(
+        Q(status=DiscordJob.PENDING) | Q(status=DiscordJob.RUNNING),
+        run_after__lte=now,
+    )
+    with transaction.atomic():
+        first_jobs = (
+            due.select_for_update(skip_locked=True)
+            .order_by("run_after")
+            .values_list("discord_user_id", flat=True)
+        )
+        discord_user_ids = []
+        for discord_user_id in first_jobs.iterator():
+            if discord_user_id not in discord_user_ids:
+                discord_user_ids.append(discord_user_id)
+                if len(discord_user_ids) == limit:
+                    break
+        # Rows of these users claimed by another worker meanwhile are no
+        # longer due once its transaction commits, so they drop out here.
+        jobs = list(
+            due.select_for_update().filter(discord_user_id__in=discord_user_ids)
+        )
+        DiscordJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=DiscordJob.RUNNING,
+            run_after=now + timedelta(seconds=DISCORD_JOB_LEASE_SECONDS),
+            updated_at=now,
+        )
+    return jobs
+
+
+def complete_jobs(jobs):
+    DiscordJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=DiscordJob.DONE,
+        access_token="",
+        last_error="",
+        updated_at=timezone.now(),
+    )
+
+
+def is_retryable(error):
+    """Return whether a failed job could succeed if it is run again later.
+
+    Rate limits, Discord server errors and network errors are transient. Other
+    errors, like an expired access token (401), a missing permission (403) or
+    an unknown member or role (404), fail the same way every time.
+    """
+    if isinstance(error, DiscordAPIError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def retry_jobs(jobs, error):
+    """Reschedule failed jobs with exponential backoff.
+
+    Jobs fail for good after the max attempts, or straight away when the error
+    is not one that retrying could fix.
+    """
+    now = timezone.now()
+    retryable = is_retryable(error)
+    for job in jobs:
+        job.attempts += 1
+        job.last_error = str(error) or repr(error)
+        job.updated_at = now
+        if not retryable or job.attempts >= DISCORD_JOB_MAX_ATTEMPTS:
+            job.status = DiscordJob.FAILED
+            job.access_token = ""
+        else:
+            job.status = DiscordJob.PENDING
+            backoff = min(
+                DISCORD_JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1),
+                DISCORD_JOB_MAX_BACKOFF_SECONDS,
+            )
+            job.run_after = now + timedelta(seconds=backoff)
+    DiscordJob.objects.bulk_update(
+        jobs,
+        ["attempts", "last_error", "status", "access_token", "run_after", "updated_at"],
+    )
+
+
+async def run_user_jobs(client, discord_user_id, jobs):
+    join_jobs = [job for job in jobs if job.kind == DiscordJob.JOIN]
+    role_ids = [job.discord_role_id for job in jobs if job.kind == DiscordJob.ROLE]
+    if join_jobs:
+        token = {"access_token": join_jobs[0].access_token}
+        await client.join_guild(discord_user_id, token, role_ids)
+    elif role_ids:
+        await client.add_user_to_roles(discord_user_id, role_ids)
+
+
+async def run_jobs(client, jobs):
+    """Apply claimed jobs, one join or batched role update per user, concurrently."""
+    jobs_by_user = defaultdict(list)
+    for job in jobs:
+        jobs_by_user[job.discord_user_id].append(job)
+
+    async def run(discord_user_id, user_jobs):
+        try:
+            await run_user_jobs(client, discord_user_id, user_jobs)
+        except (DiscordAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Discord jobs for {discord_user_id} failed: {e}")
+            return user_jobs, e
+        except Exception as e:
+            # Fail this user's jobs without taking down the rest of the batch
+            logger.exception(f"Discord jobs for {discord_user_id} failed")
+            return user_jobs, e
+        return user_jobs, None
+
+    return await asyncio.gather(
+        *(run(user_id, user_jobs) for user_id, user_jobs in jobs_by_user.items())
+    )
+
+
+def job_status(discord_user_id):
+    """Summarize a user's jobs for the status endpoint."""
+    jobs = list(
+        DiscordJob.objects.filter(discord_user_id=discord_user_id).order_by("kind")
+    )
+    statuses = {job.status for job in jobs}
+    if DiscordJob.FAILED in statuses:
+        status = DiscordJob.FAILED
+    elif statuses <= {DiscordJob.DONE}:
+        status = DiscordJob.DONE
+    else:
+        status = DiscordJob.PENDING
+    return {
+        "status": status,
+        "roles": [
+            {"name": job.role_name, "status": job.status}
+            for job in jobs
+            if job.kind == DiscordJob.ROLE
+        ],
+    }
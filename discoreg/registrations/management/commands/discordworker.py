@@ -0,0 +1,40 @@
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from registrations.discord_api import get_client
+from registrations.jobs import claim_jobs, complete_jobs, retry_jobs, run_jobs
+
+logger = logging.getLogger(__name__)
+
+DISCORD_WORKER_BATCH_SIZE = settings.DISCORD_WORKER_BATCH_SIZE
+DISCORD_WORKER_POLL_SECONDS = settings.DISCORD_WORKER_POLL_SECONDS
+
+
+async def drain_jobs():
+    client = get_client()
+    try:
+        while True:
+            jobs = await sync_to_async(claim_jobs)(DISCORD_WORKER_BATCH_SIZE)
+            if not jobs:
+                await asyncio.sleep(DISCORD_WORKER_POLL_SECONDS)
+                continue
+            logger.info(f"running {len(jobs)} Discord jobs")
+            for user_jobs, error in await run_jobs(client, jobs):
+                if error is None:
+                    await sync_to_async(complete_jobs)(user_jobs)
+                else:
+                    await sync_to_async(retry_jobs)(user_jobs, error)
+    finally:
+        await client.close()
+
+
+class Command(BaseCommand):
+    help = "Apply queued Discord guild joins and role grants."
+
+    def handle(self, *args, **options):
+        logger.info("starting Discord job worker")
+        asyncio.run(drain_jobs())
+        logger.info("Discord job worker ended")
@@ -0,0 +1,74 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from registrations.ingest import ingest_tickets, parse_tickets
+
+
+def read_csv_tickets(fh, email_column, reference_column):
+    for row in csv.DictReader(fh):
+        email = (row.get(email_column) or "").strip()
+        reference_id = (row.get(reference_column) or "").strip()
+        if email and reference_id:
+            yield email, reference_id
+
+
+def read_jsonl_tickets(fh):
+    for line in fh:
+        if line.strip():
+            yield from parse_tickets(json.loads(line))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Import registrations from a Tito ticket export (CSV or JSON lines)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the Tito export file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format (defaults to the file extension)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--email-column", default="Ticket Email")
+        parser.add_argument("--reference-column", default="Ticket Reference")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in ("csv", "jsonl"):
+            raise CommandError(f"Unknown import format for {path}, use --format")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        start = time.perf_counter()
+        ticket_count = 0
+        email_role_ids = {}
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            if file_format == "csv":
+                tickets = read_csv_tickets(
+                    fh, options["email_column"], options["reference_column"]
+                )
+            else:
+                tickets = read_jsonl_tickets(fh)
+
+            for chunk in chunked(tickets, options["chunk_size"]):
+                ingest_tickets(chunk, email_role_ids)
+                ticket_count += len(chunk)
+                self.stdout.write(f"imported {ticket_count} tickets", ending="\r")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {ticket_count} tickets for {len(email_role_ids)} emails "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+        )
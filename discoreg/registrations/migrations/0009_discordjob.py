@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registrations", "0008_auto_20210731_0402"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscordJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("join", "Join guild"), ("role", "Add role")],
+                        max_length=8,
+                    ),
+                ),
+                ("discord_user_id", models.CharField(db_index=True, max_length=32)),
+                (
+                    "discord_role_id",
+                    models.CharField(blank=True, default="", max_length=32),
+                ),
+                ("role_name", models.CharField(blank=True, default="", max_length=32)),
+                ("idempotency_key", models.CharField(max_length=80, unique=True)),
+                (
+                    "access_token",
+                    models.CharField(blank=True, default="", max_length=256),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=8,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["run_after"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"],
+                        name="registratio_status_6baab2_idx",
+                    )
+                ],
+            },
+        ),
+    ]
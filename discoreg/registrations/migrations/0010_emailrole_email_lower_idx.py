@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:39
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registrations", "0009_discordjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="emailrole",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                name="registrations_email_lower_idx",
+            ),
+        ),
+    ]
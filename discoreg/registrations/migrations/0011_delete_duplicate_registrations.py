@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:41
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def delete_duplicate_registrations(apps, schema_editor):
+    """Keep the oldest Registration per reference_id before adding the constraint."""
+    Registration = apps.get_model("registrations", "Registration")
+    duplicates = (
+        Registration.objects.values("reference_id")
+        .annotate(keep_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Registration.objects.filter(reference_id=duplicate["reference_id"]).exclude(
+            id=duplicate["keep_id"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registrations", "0010_emailrole_email_lower_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_registrations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registrations", "0011_delete_duplicate_registrations"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="registration",
+            name="reference_id",
+            field=models.CharField(max_length=32, unique=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 
 class DiscordServer(models.Model):
@@ -23,6 +25,21 @@ class DiscordRole(models.Model):
         return f"{self.name} <{self.discord_role_id}>"
 
 
+class EmailRoleQuerySet(models.QuerySet):
+    def for_email(self, email):
+        """Match an email case-insensitively using the LOWER(email) index."""
+        return self.alias(email_lower=Lower("email")).filter(email_lower=email.lower())
+
+    def for_emails(self, emails):
+        """Match any of several emails case-insensitively.
+
+        Uses the LOWER(email) index, like ``for_email``.
+        """
+        return self.alias(email_lower=Lower("email")).filter(
+            email_lower__in=[email.lower() for email in emails]
+        )
+
+
 class EmailRole(models.Model):
     email = models.EmailField(unique=True)
     discord_roles = models.ManyToManyField(DiscordRole, blank=True)
@@ -32,16 +49,19 @@ class EmailRole(models.Model):
         max_length=32, blank=True, null=True, default=None
     )
 
+    objects = EmailRoleQuerySet.as_manager()
+
     def __str__(self):
         # role_names = [role.name for role in self.discord_roles.all()]
         return f"{self.email}"
 
     class Meta:
         ordering = ["email"]
+        indexes = [models.Index(Lower("email"), name="registrations_email_lower_idx")]
 
 
 class Registration(models.Model):
-    reference_id = models.CharField(max_length=32)
+    reference_id = models.CharField(max_length=32, unique=True)
     email = models.ForeignKey(EmailRole, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -51,3 +71,46 @@ class Registration(models.Model):
 
     class Meta:
         ordering = ["email"]
+
+
+class DiscordJob(models.Model):
+    """A guild join or role grant waiting to be applied by the discordworker."""
+
+    JOIN = "join"
+    ROLE = "role"
+    KIND_CHOICES = [(JOIN, "Join guild"), (ROLE, "Add role")]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    discord_user_id = models.CharField(max_length=32, db_index=True)
+    discord_role_id = models.CharField(max_length=32, blank=True, default="")
+    role_name = models.CharField(max_length=32, blank=True, default="")
+    idempotency_key = models.CharField(max_length=80, unique=True)
+    access_token = models.CharField(max_length=256, blank=True, default="")
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.status})"
+
+    @staticmethod
+    def make_idempotency_key(discord_user_id, discord_role_id=None):
+        return f"{discord_user_id}:{discord_role_id or DiscordJob.JOIN}"
+
+    class Meta:
+        ordering = ["run_after"]
+        indexes = [models.Index(fields=["status", "run_after"])]
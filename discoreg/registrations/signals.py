@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .ingest import invalidate_default_role_ids
+from .models import DiscordRole
+
+
+@receiver(post_save, sender=DiscordRole)
+@receiver(post_delete, sender=DiscordRole)
+def discord_role_changed(sender, **kwargs):
+    # Other processes pick up the change when their cached copy expires
+    invalidate_default_role_ids()
@@ -1,3 +1,427 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import time
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
 
-# Create your tests here.
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .discord_api import DiscordAPIError, DiscordClient, get_client
+from .ingest import get_default_role_ids, ingest_tickets, invalidate_default_role_ids
+from .jobs import claim_jobs, enqueue_guild_join, retry_jobs, run_jobs
+from .models import DiscordJob, DiscordRole, DiscordServer, EmailRole, Registration
+
+ROLES = [
+    SimpleNamespace(discord_role_id="11", name="Speaker"),
+    SimpleNamespace(discord_role_id="12", name="Attendee"),
+]
+
+
+class FailingClient:
+    """Stands in for DiscordClient, raising ``errors[user_id]`` for that user."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.joined = []
+
+    async def join_guild(self, user_id, token, role_ids):
+        if user_id in self.errors:
+            raise self.errors[user_id]
+        self.joined.append(user_id)
+
+
+class DiscordJobTests(TestCase):
+    def test_claims_every_job_of_each_user(self):
+        for user_id in ("1", "2", "3"):
+            enqueue_guild_join(user_id, f"token-{user_id}", ROLES)
+
+        first = claim_jobs(limit=2)
+        second = claim_jobs(limit=2)
+
+        self.assertEqual(
+            Counter(job.discord_user_id for job in first), {"1": 3, "2": 3}
+        )
+        self.assertEqual(Counter(job.discord_user_id for job in second), {"3": 3})
+        self.assertEqual(claim_jobs(limit=2), [])
+
+    def test_permanent_errors_fail_immediately(self):
+        for status in (400, 401, 403, 404):
+            with self.subTest(status=status):
+                jobs = enqueue_guild_join(f"user-{status}", "token", ROLES)
+                retry_jobs(claim_jobs(limit=1), DiscordAPIError(status))
+
+                self.assertEqual(
+                    set(
+                        DiscordJob.objects.filter(
+                            discord_user_id=jobs[0].discord_user_id
+                        ).values_list("status", flat=True)
+                    ),
+                    {DiscordJob.FAILED},
+                )
+
+    def test_transient_errors_are_retried(self):
+        errors = [
+            DiscordAPIError(429),
+            DiscordAPIError(503),
+            aiohttp.ClientConnectionError(),
+            asyncio.TimeoutError(),
+        ]
+        for n, error in enumerate(errors):
+            with self.subTest(error=error):
+                enqueue_guild_join(f"user-{n}", "token", ROLES)
+                retry_jobs(claim_jobs(limit=1), error)
+
+                job = DiscordJob.objects.get(
+                    discord_user_id=f"user-{n}", kind=DiscordJob.JOIN
+                )
+                self.assertEqual(job.status, DiscordJob.PENDING)
+                self.assertEqual(job.attempts, 1)
+
+    def test_unexpected_error_only_fails_that_user(self):
+        enqueue_guild_join("1", "token", ROLES)
+        enqueue_guild_join("2", "token", ROLES)
+        client = FailingClient({"1": KeyError("roles")})
+
+        with self.assertLogs("registrations.jobs", level="ERROR"):
+            results = asyncio.run(run_jobs(client, claim_jobs(limit=2)))
+
+        errors = {jobs[0].discord_user_id: error for jobs, error in results}
+        self.assertIsInstance(errors["1"], KeyError)
+        self.assertIsNone(errors["2"])
+        self.assertEqual(client.joined, ["2"])
+
+
+class FakeDiscord:
+    """Serves the Discord API on localhost, answering with ``respond(request)``."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append((request.path, time.monotonic()))
+        return self.respond(request)
+
+    def run(self, requests):
+        """Run ``requests(client)`` against the server and return its result."""
+
+        async def run():
+            app = web.Application()
+            app.router.add_route("*", "/{path:.*}", self.handle)
+            async with TestServer(app) as server:
+                client = DiscordClient(str(server.make_url("")), "token", "1")
+                try:
+                    return client, await requests(client)
+                finally:
+                    await client.close()
+
+        return asyncio.run(run())
+
+
+def rate_limited(retry_after, headers=None, is_global=False):
+    """Answer the first request with a 429 and every later one with 200."""
+    answered = []
+
+    def respond(request):
+        answered.append(request)
+        if len(answered) == 1:
+            return web.json_response(
+                {"retry_after": retry_after, "global": is_global},
+                status=429,
+                headers=headers,
+            )
+        return web.json_response({})
+
+    return respond
+
+
+def exhausted_bucket(request):
+    return web.json_response(
+        {},
+        headers={
+            "X-RateLimit-Bucket": "abc",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset-After": "0.05",
+        },
+    )
+
+
+class DiscordClientRateLimitTests(SimpleTestCase):
+    def elapsed(self, discord):
+        times = [sent for _, sent in discord.requests]
+        return times[-1] - times[0]
+
+    def test_429_is_retried_after_retry_after(self):
+        discord = FakeDiscord(rate_limited(0.05))
+        with self.assertLogs("registrations.discord_api", level="WARNING"):
+            client, channel = discord.run(lambda client: client.get_channel(1))
+
+        self.assertEqual(channel, {})
+        self.assertEqual(len(discord.requests), 2)
+        self.assertGreaterEqual(self.elapsed(discord), 0.05)
+        # Counted once for the 429 and once for the wait before retrying
+        self.assertEqual(client.throttle_counts, {"GET /channels/1": 2})
+
+    def test_global_limit_delays_every_route(self):
+        discord = FakeDiscord(
+            rate_limited(0.05, headers={"X-RateLimit-Global": "true"})
+        )
+
+        async def requests(client):
+            await client.get_channel(1)
+            await client.get_channel(2)
+
+        with self.assertLogs("registrations.discord_api", level="WARNING"):
+            client, _ = discord.run(requests)
+
+        self.assertGreaterEqual(self.elapsed(discord), 0.05)
+        self.assertEqual(client.throttle_counts["global"], 1)
+        self.assertEqual(client.throttle_counts["GET /channels/1"], 1)
+        self.assertNotIn("GET /channels/2", client.throttle_counts)
+
+    def test_exhausted_bucket_waits_for_reset(self):
+        discord = FakeDiscord(exhausted_bucket)
+
+        async def requests(client):
+            await client.get_channel(1)
+            await client.get_channel(1)
+
+        with self.assertLogs("registrations.discord_api", level="WARNING"):
+            client, _ = discord.run(requests)
+
+        self.assertGreaterEqual(self.elapsed(discord), 0.05)
+        self.assertEqual(client.throttle_counts, {"abc:/channels/1": 1})
+
+    def test_throttle_counts_are_kept_per_major_parameter(self):
+        discord = FakeDiscord(exhausted_bucket)
+
+        async def requests(client):
+            for channel_id in (1, 1, 2, 2):
+                await client.get_channel(channel_id)
+
+        with self.assertLogs("registrations.discord_api", level="WARNING"):
+            client, _ = discord.run(requests)
+
+        self.assertEqual(
+            client.throttle_counts, {"abc:/channels/1": 1, "abc:/channels/2": 1}
+        )
+
+
+class GetClientTests(SimpleTestCase):
+    def test_session_is_closed_when_its_loop_shuts_down(self):
+        async def open_session():
+            client = get_client()
+            self.assertFalse(client.session.closed)
+            return client
+
+        first = asyncio.run(open_session())
+        second = asyncio.run(open_session())
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+
+
+class TitoWebhookTests(TestCase):
+    def setUp(self):
+        invalidate_default_role_ids()
+        self.addCleanup(invalidate_default_role_ids)
+        self.server = DiscordServer.objects.create(name="PyOhio", server_id="1")
+
+    def post(self, payload):
+        with self.assertLogs("registrations.views.tito", level="WARNING"):
+            return self.client.post(
+                reverse("registrations:tito-webhook"),
+                json.dumps(payload),
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {settings.TITO_WEBHOOK_TOKEN}",
+            )
+
+    def registered_emails(self):
+        return dict(Registration.objects.values_list("reference_id", "email__email"))
+
+    def test_multi_ticket_payload(self):
+        response = self.post(
+            {
+                "email": "buyer@example.com",
+                "reference": "ABCD",
+                "tickets": [
+                    {"email": "Speaker@Example.com", "reference": "ABCD-1"},
+                    {"email": None, "reference": "ABCD-2"},
+                    {"reference": "ABCD-3"},
+                ],
+            }
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.registered_emails(),
+            {
+                "ABCD-1": "speaker@example.com",
+                "ABCD-2": "buyer@example.com",
+                "ABCD-3": "buyer@example.com",
+            },
+        )
+
+    def test_ticket_without_email_is_skipped(self):
+        with self.assertLogs("registrations.ingest", level="WARNING"):
+            response = self.post(
+                [
+                    {"email": None, "reference": "ABCD-1"},
+                    {"email": "attendee@example.com", "reference": "ABCD-2"},
+                ]
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.registered_emails(), {"ABCD-2": "attendee@example.com"})
+
+    def test_replayed_webhook_is_a_no_op(self):
+        payload = {"email": "attendee@example.com", "reference": "ABCD-1"}
+
+        for _ in range(3):
+            self.assertEqual(self.post(payload).status_code, 201)
+
+        self.assertEqual(Registration.objects.count(), 1)
+        self.assertEqual(EmailRole.objects.count(), 1)
+
+    def test_cached_default_roles_are_attached(self):
+        attendee = DiscordRole.objects.create(
+            name="Attendee", discord_role_id="11", discord_server=self.server
+        )
+        DiscordRole.objects.create(
+            name="Speaker", discord_role_id="12", discord_server=self.server
+        )
+        attendee.assign_by_default = True
+        attendee.save()
+
+        self.post({"email": "first@example.com", "reference": "ABCD-1"})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_default_role_ids(), [attendee.id])
+        self.post({"email": "second@example.com", "reference": "ABCD-2"})
+
+        for email_role in EmailRole.objects.all():
+            self.assertEqual(list(email_role.discord_roles.all()), [attendee])
+
+
+class RegistrationUpsertTests(TestCase):
+    def setUp(self):
+        invalidate_default_role_ids()
+        self.addCleanup(invalidate_default_role_ids)
+
+    def test_replayed_and_updated_tickets_reuse_the_email_role(self):
+        server = DiscordServer.objects.create(name="PyOhio", server_id="1")
+        speaker = DiscordRole.objects.create(
+            name="Speaker", discord_role_id="11", discord_server=server
+        )
+        attendee = DiscordRole.objects.create(
+            name="Attendee",
+            discord_role_id="12",
+            discord_server=server,
+            assign_by_default=True,
+        )
+        existing = EmailRole.objects.create(
+            email="attendee@example.com", discord_user_id="42"
+        )
+        existing.discord_roles.add(speaker)
+
+        ingest_tickets([("Attendee@Example.com", "ABCD-1")])
+        ingest_tickets([("Attendee@Example.com", "ABCD-1")])
+        ingest_tickets([("ATTENDEE@example.com", "ABCD-1"), ("a@b.com", "ABCD-2")])
+
+        email_role = EmailRole.objects.get(email="attendee@example.com")
+        self.assertEqual(email_role.id, existing.id)
+        self.assertEqual(email_role.discord_user_id, "42")
+        self.assertEqual(set(email_role.discord_roles.all()), {speaker, attendee})
+        self.assertEqual(EmailRole.objects.count(), 2)
+        self.assertEqual(
+            dict(Registration.objects.values_list("reference_id", "email_id")),
+            {
+                "ABCD-1": existing.id,
+                "ABCD-2": EmailRole.objects.get(email="a@b.com").id,
+            },
+        )
+
+
+class DeleteDuplicateRegistrationsMigrationTests(TransactionTestCase):
+    before = [("registrations", "0010_emailrole_email_lower_idx")]
+    after = [("registrations", "0012_registration_unique_reference_id")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_keeps_the_oldest_registration_per_reference(self):
+        apps = self.migrate(self.before)
+        EmailRole = apps.get_model("registrations", "EmailRole")
+        Registration = apps.get_model("registrations", "Registration")
+        email = EmailRole.objects.create(email="attendee@example.com")
+        kept = [
+            Registration.objects.create(email=email, reference_id=reference_id).id
+            for reference_id in ("ABCD-1", "ABCD-2")
+        ]
+        for _ in range(2):
+            Registration.objects.create(email=email, reference_id="ABCD-1")
+
+        apps = self.migrate(self.after)
+        Registration = apps.get_model("registrations", "Registration")
+
+        self.assertEqual(
+            sorted(Registration.objects.values_list("id", flat=True)), kept
+        )
+
+
+class ImportRegistrationsTests(TestCase):
+    def setUp(self):
+        invalidate_default_role_ids()
+        self.addCleanup(invalidate_default_role_ids)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "tickets.csv"
+        self.path.write_text(
+            "Ticket Reference,Ticket Email\n"
+            "ABCD-1,attendee@example.com\n"
+            "ABCD-2,Attendee@Example.com\n"
+            "ABCD-3,speaker@example.com\n"
+            "ABCD-4,\n"
+        )
+
+    def test_imports_csv_in_chunks(self):
+        stdout = StringIO()
+        call_command(
+            "import_registrations", str(self.path), chunk_size=2, stdout=stdout
+        )
+
+        self.assertIn("Imported 3 tickets for 2 emails", stdout.getvalue())
+        self.assertEqual(
+            dict(Registration.objects.values_list("reference_id", "email__email")),
+            {
+                "ABCD-1": "attendee@example.com",
+                "ABCD-2": "attendee@example.com",
+                "ABCD-3": "speaker@example.com",
+            },
+        )
+
+    def test_chunk_size_must_be_positive(self):
+        for chunk_size in (0, -1):
+            with self.subTest(chunk_size=chunk_size):
+                with self.assertRaisesMessage(CommandError, "--chunk-size"):
+                    call_command(
+                        "import_registrations", str(self.path), chunk_size=chunk_size
+                    )
+        self.assertFalse(Registration.objects.exists())
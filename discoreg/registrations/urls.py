@@ -6,5 +6,6 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("callback", views.callback, name="callback"),
     path("link", views.link, name="link"),
+    path("status", views.status, name="status"),
     path("tito-webhook", views.tito_webhook, name="tito-webhook"),
 ]
@@ -1,26 +1,28 @@
 import bleach
-import requests
+from asgiref.sync import sync_to_async
+from django.core import signing
 from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.conf import settings
 from django.shortcuts import redirect, render
-from oauthlib.oauth2.rfc6749.errors import InvalidClientIdError
 from requests_oauthlib import OAuth2Session
 
+from ..discord_api import DiscordAPIError, get_client
+from ..jobs import enqueue_guild_join, job_status
 from ..models import EmailRole
 from .tito import tito_webhook
 
 
-DISCORD_API_BASE_URL = settings.DISCORD_API_BASE_URL
 DISCORD_AUTHORIZATION_BASE_URL = settings.DISCORD_AUTHORIZATION_BASE_URL
-DISCORD_BOT_TOKEN = settings.DISCORD_BOT_TOKEN
 DISCORD_CLIENT_ID = settings.DISCORD_CLIENT_ID
 DISCORD_CLIENT_SECRET = settings.DISCORD_CLIENT_SECRET
-DISCORD_GUILD_ID = settings.DISCORD_GUILD_ID
 DISCORD_SCOPES = settings.DISCORD_SCOPES
 DISCORD_TOKEN_URL = settings.DISCORD_TOKEN_URL
 
+STATUS_TOKEN_SALT = "registrations.status"
+STATUS_TOKEN_MAX_AGE = 60 * 60
+
 
 def make_callback_uri(request):
     # FIXME: This is giving us an HTTP URL and we need HTTPS. Probably another way to do this?
@@ -58,39 +60,11 @@ def render_error_response(request, error_title=None, error_message=None, status=
     return render(request, "registrations/error.html", context=context, status=status)
 
 
-def get_user(auth_session):
-    return auth_session.get(f"{DISCORD_API_BASE_URL}/users/@me").json()
-
-
-def add_user_to_guild(user_id, token):
-    """Add a user to a server (guild). Requires server user management and the user's permission."""
-    auth_headers = {
-        "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
-    }
-    url = f"{DISCORD_API_BASE_URL}/guilds/{DISCORD_GUILD_ID}/members/{user_id}"
-    response = requests.put(
-        url, json={"access_token": token["access_token"]}, headers=auth_headers
-    )
-    response.raise_for_status()
-    return response
-
-
-def add_user_to_role(user_id, role_id):
-    """Add a role to a user. Requires server role management."""
-    auth_headers = {
-        "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
-    }
-    url = f"{DISCORD_API_BASE_URL}/guilds/{DISCORD_GUILD_ID}/members/{user_id}/roles/{role_id}"
-    response = requests.put(url, headers=auth_headers, json={})
-    response.raise_for_status()
-    return response
-
-
 def index(request):
     return render(request, "registrations/index.html")
 
 
-def callback(request):
+async def callback(request):
     """Handle callback after authentication with Discord. Adds authenticated user to server and roles(s)."""
     if request.GET.get("error"):
         return render_error_response(
@@ -101,28 +75,32 @@ def callback(request):
         )
 
     callback_uri = make_callback_uri(request)
+    discord = get_client()
 
-    discord_session = make_session(callback_uri, state=request.GET.get("state"))
     try:
-        token = discord_session.fetch_token(
-            DISCORD_TOKEN_URL,
-            client_secret=DISCORD_CLIENT_SECRET,
-            code=request.GET["code"],
-            authorization_response=f"https://tylerdave.ngrok.com/{request.get_full_path()}",
-        )
-    except InvalidClientIdError:
-        return render_error_response(
-            request, error_message="Authorization invalid or expired."
-        )
-    except:
+        token = await discord.exchange_code(request.GET["code"], callback_uri)
+    except DiscordAPIError as e:
+        if e.status in (400, 401):
+            return render_error_response(
+                request, error_message="Authorization invalid or expired."
+            )
+        return render_error_response(request)
+    except Exception:
         return render_error_response(request)
 
-    auth_session = make_session(callback_uri, token=token)
-
-    user = get_user(auth_session)
+    try:
+        user = await discord.get_user(token)
+    except DiscordAPIError as e:
+        if e.status == 401:
+            return render_error_response(
+                request, error_message="Authorization invalid or expired."
+            )
+        return render_error_response(request)
+    except Exception:
+        return render_error_response(request)
 
     try:
-        email_roles = EmailRole.objects.get(email__iexact=user["email"])
+        email_roles = await EmailRole.objects.for_email(user["email"]).aget()
     except ObjectDoesNotExist:
         return render_error_response(
             request,
@@ -130,24 +108,37 @@ def callback(request):
             error_message=f"A speaker record could not be found using your Discord account email address: {user['email']}. If you used a different email address for the CFP, please contact us at info@pyohio.org with your Discord username and email.",
         )
 
-    add_user_to_guild(user["id"], token)
+    discord_roles = [role async for role in email_roles.discord_roles.all()]
+    await sync_to_async(enqueue_guild_join)(
+        user["id"], token["access_token"], discord_roles
+    )
 
     email_roles.discord_user_id = user["id"]
-    email_roles.save()
-
-    added_roles = []
-    for discord_role in email_roles.discord_roles.all():
-        add_user_to_role(user["id"], discord_role.discord_role_id)
-        added_roles.append(discord_role.name)
+    await email_roles.asave()
 
+    status_token = signing.dumps(user["id"], salt=STATUS_TOKEN_SALT)
     context = {
         "joined_username": user["username"],
         "joined_email": user["email"],
-        "added_roles": added_roles,
+        "added_roles": [role.name for role in discord_roles],
+        "status_url": f"{reverse('registrations:status')}?token={status_token}",
     }
     return render(request, "registrations/success.html", context)
 
 
+def status(request):
+    """Report progress of the queued join and role grants for the success page."""
+    try:
+        discord_user_id = signing.loads(
+            request.GET.get("token", ""),
+            salt=STATUS_TOKEN_SALT,
+            max_age=STATUS_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return JsonResponse({"error": "Invalid or expired status token."}, status=400)
+    return JsonResponse(job_status(discord_user_id))
+
+
 def link(request):
     """Redirect to Discord auth URL which prompts for user permissions."""
     callback_uri = make_callback_uri(request)
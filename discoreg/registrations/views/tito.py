@@ -1,13 +1,11 @@
 import json
 import logging
-import os
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponse
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 
-from ..models import DiscordRole, EmailRole, Registration
+from ..ingest import ingest_tickets, parse_tickets
 
 
 logger = logging.getLogger(__name__)
@@ -23,18 +21,11 @@ def tito_webhook(request):
     payload = json.loads(request.body.decode("utf-8"))
     logger.warning(payload)
 
-    default_roles = DiscordRole.objects.filter(assign_by_default=True)
-
     try:
-        email_role = EmailRole.objects.get(email__iexact=payload["email"])
-    except ObjectDoesNotExist:
-        email_role = EmailRole(email=payload["email"].lower())
-        email_role.save()
-
-    logger.error(email_role)
-    email_role.discord_roles.add(*default_roles)
-    email_role.save()
-    registration = Registration(email=email_role, reference_id=payload["reference_id"])
-    registration.save()
+        tickets = parse_tickets(payload)
+    except (KeyError, AttributeError, TypeError):
+        return HttpResponse("Bad Request", status=400)
+
+    ingest_tickets(tickets)
 
     return HttpResponse(status=201)